@@ -1,224 +1,165 @@
-import requests
-from huggingface_hub import hf_hub_download
+import huggingface_hub
+from huggingface_hub import hf_hub_download, try_to_load_from_cache
 import geopandas as gpd
-from io import BytesIO
-import streamlit as st
-import time
-from functools import wraps
-
+import math
+import pandas as pd
+import os
+from functools import lru_cache, wraps
+from urllib.parse import urlsplit
+
+import arcgis
+import layer_cache
+import metrics
+import retries
+
+HF_REPO = "MMNASH10/my-parquet-dataset"
+
+# Retries a whole loader on transient errors only (see retries.py), with
+# jittered exponential backoff starting at delay. ArcGIS requests are
+# already retried one by one, so errors that gave up there aren't retried again.
 def retry_loader(max_attempts=3, delay=2):
+    policy = retries.RetryPolicy(max_attempts=max_attempts, base_delay=delay)
+
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            last_exception = None
-            for attempt in range(max_attempts):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    last_exception = e
-                    time.sleep(delay)
-            raise last_exception
+            with metrics.stage(f"loader.{func.__name__}") as record:
+                result = policy.run(lambda: func(*args, **kwargs), name=func.__name__, record=record)
+                if result is not None:
+                    record["features"] = len(result)
+            return result
         return wrapper
     return decorator
 
+# Path to a file of our Hugging Face dataset, downloaded unless it is cached
+def download_dataset_file(filename):
+    with metrics.stage("hf_hub_download", filename=filename) as record:
+        cached = isinstance(try_to_load_from_cache(HF_REPO, filename, repo_type="dataset"), str)
+        path = retries.HTTP_POLICY.run(
+            lambda: hf_hub_download(repo_id=HF_REPO, filename=filename, repo_type="dataset"),
+            host=urlsplit(huggingface_hub.constants.ENDPOINT).netloc, record=record)
+        record["bytes"] = os.path.getsize(path)
+        record["cache"] = "hit" if cached else "miss"
+    metrics.count("hf_cache", result=record["cache"])
+    if not cached:
+        metrics.count("bytes_downloaded", record["bytes"], source="huggingface")
+    return path
+
+# Standard ArcGIS query for a whole layer, paged through arcgis.py and served
+# from the disk cache. bbox (minx, miny, maxx, maxy in EPSG:4326) asks the
+# server for only the features around the selected states. Only the
+# geometry is fetched unless fields names the attribute columns to keep,
+# already generalized by the server to the cache's simplify tolerance.
+def query_layer(url, ttl=layer_cache.DEFAULT_TTL, bbox=None, fields=None):
+    params = {
+        "where": "1=1",
+    }
+    if fields:
+        params["outFields"] = ",".join(fields)
+    if layer_cache.SIMPLIFY_TOLERANCE:
+        params["maxAllowableOffset"] = layer_cache.SIMPLIFY_TOLERANCE
+    if bbox is not None:
+        # Whole degrees so nearby selections share a cache entry
+        minx, miny, maxx, maxy = bbox
+        bbox = (math.floor(minx), math.floor(miny), math.ceil(maxx), math.ceil(maxy))
+        params.update(arcgis.bbox_params(bbox))
+    return layer_cache.fetch_layer(url, params, ttl=ttl, download=arcgis.download_layer)
+
+# -- USDA --
+@retry_loader(max_attempts=3, delay=2)
+def load_usda_data(bbox=None):
+    url = "https://rdgdwe.sc.egov.usda.gov/arcgis/rest/services/Eligibility/Eligibility/MapServer/2/query"
+    # https://rdgdwe.sc.egov.usda.gov/arcgis/rest/services/Eligibility/RD_RHS_AK_OFFROAD/MapServer
+    # USDA eligibility boundaries only change a few times a year
+    return query_layer(url, ttl=7 * layer_cache.DAY, bbox=bbox)
+
 # -- Alabama --
-def is_al_ez(geoid):
-    county_fips = {"01005", "01007", "01011", "01013", "01017", "01019", "01021", "01023", "01025", "01027", "01029",
+AL_EZ_COUNTIES = {"01005", "01007", "01011", "01013", "01017", "01019", "01021", "01023", "01025", "01027", "01029",
                    "01031", "01033", "01035", "01037", "01039", "01041", "01045", "01047", "01053", "01057", "01059",
                    "01061", "01063", "01065", "01067", "01071", "01075", "01079", "01085", "01087", "01091", "01093",
                    "01099", "01105", "01107", "01109", "01111", "01113", "01119", "01123", "01129", "01131", "01133"}
 
-    return str(geoid)[:5] in county_fips
-
 # -- Colorado --
-st.cache_data(show_spinner="Loading CO Enterprise zones...")
 @retry_loader(max_attempts=3, delay=2)
 def load_co_ez_data():
     url = "https://gis.colorado.gov/public/rest/services/OEDIT/Enterprise_Zones/MapServer/2/query"
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "f": "geojson"
-    }
-    resp = requests.get(url, params=params)
-    resp.raise_for_status()
-    gdf = gpd.read_file(BytesIO(resp.content), driver="geojson")
-    return gdf
+    return query_layer(url)
 
-st.cache_data(show_spinner="Loading CO Enhanced Rural Enterprise zones...")
 @retry_loader(max_attempts=3, delay=2)
 def load_co_erez_data():
     url = "https://gis.colorado.gov/public/rest/services/OEDIT/Enterprise_Zones/MapServer/1/query"
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "f": "geojson"
-    }
-    resp = requests.get(url, params=params)
-    resp.raise_for_status()
-    gdf = gpd.read_file(BytesIO(resp.content), driver="geojson")
-    return gdf
+    return query_layer(url)
 
 # -- Florida --
     # Rural Job Tax Credit
-def is_fl_rjtc(geoid):
-    county_fips = {"12003", "12045", "12079", "12047", "12089", "12007", "12049", "12093", "12013", "12051", "12023",
+FL_RJTC_COUNTIES = {"12003", "12045", "12079", "12047", "12089", "12007", "12049", "12093", "12013", "12051", "12023",
                    "12055", "12107", "12027", "12059", "12029", "12035", "12037", "12039", "12041", "12043", "12063",
                    "12065", "12067", "12075", "12077", "12121", "12123", "12125", "12129", "12131", "12133"}
 
-    return str(geoid)[:5] in county_fips
-
     # Rural Area Opportunity
-@st.cache_data(show_spinner="Loading FL RAO zones...")
 @retry_loader(max_attempts=3, delay=2)
 def load_fl_rao_data():
     url = "https://services1.arcgis.com/nRHtyn3uE1kyzoYc/ArcGIS/rest/services/Rural_Areas_of_Opportunity/FeatureServer/0/query"
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "f": "geojson"
-    }
-    resp = requests.get(url, params=params)
-    resp.raise_for_status()
-    gdf = gpd.read_file(BytesIO(resp.content), driver="geojson")
-    return gdf
+    return query_layer(url)
 
 # -- Hawaii --
-@st.cache_data(show_spinner="Loading HI Enterprise zones...")
 @retry_loader(max_attempts=3, delay=2)
 def load_hi_ez_data():
     url = "https://geodata.hawaii.gov/arcgis/rest/services/BusinessEconomy/MapServer/4/query"
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "f": "geojson"
-    }
-    resp = requests.get(url, params=params)
-    resp.raise_for_status()
-    gdf = gpd.read_file(BytesIO(resp.content), driver="geojson")
-    return gdf
+    return query_layer(url)
 
 # -- Illinois --
-@st.cache_data(show_spinner="Loading IL Enterprise zones...")
 @retry_loader(max_attempts=3, delay=2)
 def load_il_ez_data():
     url = "https://aglomaps.revenue.illinois.gov/arcgis/rest/services/EZ_Zone_Admin_2025/MapServer/0/query"
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "f": "geojson"
-    }
-    resp = requests.get(url, params=params)
-    resp.raise_for_status()
-    gdf = gpd.read_file(BytesIO(resp.content), driver="geojson")
-    return gdf
+    return query_layer(url)
 
 # -- Maryland --
-@st.cache_data(show_spinner="Loading MD Enterprise zones...")
 @retry_loader(max_attempts=3, delay=2)
 def load_md_ez_data():
     url = "https://mdgeodata.md.gov/imap/rest/services/BusinessEconomy/MD_IncentiveZones/FeatureServer/5/query"
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "f": "geojson"
-    }
-    resp = requests.get(url, params=params)
-    resp.raise_for_status()
-    gdf = gpd.read_file(BytesIO(resp.content), driver="geojson")
-    return gdf
+    return query_layer(url)
 
 # -- Missouri --
-@st.cache_data(show_spinner="Loading MO Enterprise zones...")
+# The EEZ is split over two layers and a point only needs to be in either,
+# so their polygons are stacked into one layer (overlaps are harmless to a
+# point-in-polygon query) instead of dissolving and unioning them. Both
+# parts come from the layer cache, and the result is versioned by both.
 @retry_loader(max_attempts=3, delay=2)
 def load_mo_ez_data():
-    url1 = "https://gis.mo.gov/arcgis/rest/services/DED/EEZ/MapServer/1/query"
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "f": "geojson"
-    }
-    resp = requests.get(url1, params=params)
-    resp.raise_for_status()
-    gdf1 = gpd.read_file(BytesIO(resp.content), driver="geojson")
-
-    url2 = "https://gis.mo.gov/arcgis/rest/services/DED/EEZ/MapServer/2/query"
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "f": "geojson"
-    }
-    resp = requests.get(url2, params=params)
-    resp.raise_for_status()
-    gdf2 = gpd.read_file(BytesIO(resp.content), driver="geojson")
-
-    gdf1 = gdf1.to_crs("EPSG:4326")
-    gdf2 = gdf2.to_crs("EPSG:4326")
-
-    gdf1_dissolved = gdf1.dissolve()
-    gdf2_dissolved = gdf2.dissolve()
-
-    gdf = gpd.overlay(gdf1_dissolved, gdf2_dissolved, how="union", keep_geom_type=False)
-
-    gdf = gdf[gdf.is_valid & ~gdf.is_empty]
-    gdf = gdf.explode(ignore_index=True)
-    gdf = gdf[gdf.geometry.type.isin(["Polygon", "MultiPolygon"])]
-
+    parts = [query_layer(f"https://gis.mo.gov/arcgis/rest/services/DED/EEZ/MapServer/{layer}/query")
+             for layer in (1, 2)]
+    gdf = gpd.GeoDataFrame(geometry=pd.concat([part.geometry for part in parts], ignore_index=True),
+                           crs=parts[0].crs)
+    gdf.attrs["version"] = "+".join(part.attrs["version"] for part in parts)
+    gdf.sindex
     return gdf
 
 # -- Nebraska --
-@st.cache_data(show_spinner="Loading NE iHub zones...")
 @retry_loader(max_attempts=3, delay=2)
 def load_ne_ihub_data():
     url = "https://gis.ne.gov/Agency/rest/services/IHubEligibleDED/FeatureServer/0/query"
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "f": "geojson"
-    }
-    resp = requests.get(url, params=params)
-    resp.raise_for_status()
-    gdf = gpd.read_file(BytesIO(resp.content), driver="geojson")
-    return gdf
+    return query_layer(url)
 
-@st.cache_data(show_spinner="Loading NE Enterprise zones...")
 @retry_loader(max_attempts=3, delay=2)
 def load_ne_ez_data():
     url = "https://gis.ne.gov/Agency/rest/services/EntprznsDED/FeatureServer/0/query"
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "f": "geojson"
-    }
-    resp = requests.get(url, params=params)
-    resp.raise_for_status()
-    gdf = gpd.read_file(BytesIO(resp.content), driver="geojson")
-    return gdf
+    return query_layer(url)
 
 # -- Texas --
-@st.cache_data(show_spinner="Loading TX Enterprise zones...")
+@lru_cache(maxsize=None)
 @retry_loader(max_attempts=3, delay=2)
 def load_tx_ez_data():
-    parquet_path = hf_hub_download(
-        repo_id="MMNASH10/my-parquet-dataset",
-        filename="TEZ_2020_complete.parquet",
-        repo_type="dataset",
-    )
-    gdf = gpd.read_parquet(parquet_path)
+    parquet_path = download_dataset_file("TEZ_2020_complete.parquet")
+    gdf = layer_cache.normalize_layer(gpd.read_parquet(parquet_path, memory_map=True))
+    # The snapshot path names the dataset revision, so it changes with the file
+    gdf.attrs["version"] = f"hf:{parquet_path}"
+    gdf.sindex
     return gdf
 
 # -- Virginia --
-@st.cache_data(show_spinner="Loading VA Enterprise zones...")
 @retry_loader(max_attempts=3, delay=2)
 def load_va_ez_data():
     url = "https://maps.vedp.org/arcgis/rest/services/OpenData/OpenDataLayers/MapServer/3/query"
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "f": "geojson"
-    }
-    resp = requests.get(url, params=params)
-    resp.raise_for_status()
-    gdf = gpd.read_file(BytesIO(resp.content), driver="geojson")
-    return gdf
+    return query_layer(url)
 
@@ -1,121 +1,88 @@
+import json
+import os
 import tempfile
 
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
-from huggingface_hub import hf_hub_download
 import pydeck as pdk
-import folium
-from streamlit_folium import st_folium
-import openpyxl
-import requests
-from io import BytesIO
-from shapely import wkt
-import numpy as np
 
-import EZ_loaders
+import eligibility_index
+import map_layers
+import metrics
+import result_export
+import result_memo
+import retries
+import snapshot
+import streaming
+import tract_index
+import zone_checker
 
 st.set_page_config(page_title="Zone Eligibility Check Tool", page_icon="🌲", layout="wide")
 st.title("Zone Eligibility Check Tool")
 
-STATE_FIPS = {
-    "Alabama": "01", "Alaska": "02", "American Samoa": "60", "Arizona": "04", "Arkansas": "05",
-    "California": "06", "Colorado": "08", "Connecticut": "09", "Delaware": "10", "District of Columbia": "11",
-    "Florida": "12", "Georgia": "13", "Guam": "66", "Hawaii": "15", "Idaho": "16",
-    "Illinois": "17", "Indiana": "18", "Iowa": "19", "Kansas": "20",
-    "Kentucky": "21", "Louisiana": "22", "Maine": "23", "Maryland": "24", "Massachusetts": "25",
-    "Michigan": "26", "Minnesota": "27", "Mississippi": "28", "Missouri": "29",
-    "Montana": "30", "Nebraska": "31", "Nevada": "32", "New Hampshire": "33",
-    "New Jersey": "34", "New Mexico": "35", "New York": "36", "North Carolina": "37",
-    "North Dakota": "38", "North Mariana Islands": "69", "Ohio": "39", "Oklahoma": "40", "Oregon": "41",
-    "Pennsylvania": "42", "Puerto Rico": "72", "Rhode Island": "44", "South Carolina": "45", "South Dakota": "46", "Tennessee": "47",
-    "Texas": "48", "Utah": "49", "Vermont": "50", "Virgin Islands": "78", "Virginia": "51", "Washington": "53",
-    "West Virginia": "54", "Wisconsin": "55", "Wyoming": "56",
-}
+STATE_FIPS = zone_checker.STATE_FIPS
+
+# With ZONE_SNAPSHOT set every layer comes from that offline snapshot (see
+# snapshot.py) instead of being downloaded
+offline_snapshot = snapshot.current()
+
+# The national tract index (built with tract_index.py) resolves points in
+# any state, so selecting states becomes optional
+national_index = offline_snapshot.tract_index() if offline_snapshot is not None else tract_index.get_index()
 
 # prompt user to select states
 selected_states = st.multiselect(
     "Select the states you want to check:",
     options = list(STATE_FIPS.keys()),
+    help="Leave empty to check points in any state." if national_index is not None else None,
 )
 
-# Load selected states' files
-@st.cache_data(show_spinner="Loading geospatial data...")
-def load_states_tracts(fips_codes):
-    gdf_list = []
-    for fips in fips_codes:
-        parquet_path = hf_hub_download(
-            repo_id = "MMNASH10/my-parquet-dataset",
-            filename = f"tl_2024_{fips}_tract.parquet",
-            repo_type = "dataset",
-        )
-        gdf = gpd.read_parquet(parquet_path)
-        gdf_list.append(gdf)
-    return pd.concat(gdf_list).reset_index(drop=True)
-
-# Load tracts only if states are selected
-tracts_gdf = None
+# Load eligibility flags index (built from eligibility_flags.csv)
+@st.cache_resource
+def load_eligibility_index():
+    # read docs if needed
+    return eligibility_index.load_eligibility_index()
+
+# Per point results shared by every engine (and saved for later sessions),
+# so changing the state selection or re-uploading an edited file only
+# checks what is new
+@st.cache_resource
+def get_result_memo():
+    return result_memo.ResultMemo(store=result_memo.default_store())
+
+# One engine per state selection (None = every state, via the national
+# index). Tracts, USDA and the state zone layers download in parallel and
+# the engine is shared across reruns. Layers and tracts already loaded for
+# another selection are reused, so only new states are downloaded.
+@st.cache_resource(show_spinner=False)
+def get_zone_checker(fips_codes):
+    if offline_snapshot is not None:
+        return offline_snapshot.checker(fips_codes, memo=get_result_memo())
+    progress = st.progress(0.0, text="Loading geospatial data...")
+
+    def on_progress(layer, done, total, error):
+        text = f"Loaded {layer}" if error is None else f"Failed to load {layer}"
+        progress.progress(min(done / total, 1.0), text=text)
+
+    checker = zone_checker.ZoneChecker(fips_codes, eligibility=load_eligibility_index(), memo=get_result_memo())
+    checker.load(on_progress=on_progress)
+    progress.empty()
+    return checker
+
+# Load layers only if states are selected
+checker = None
 selected_fips = None
 if selected_states:
     selected_fips = [STATE_FIPS[state] for state in selected_states]
     try:
-        tracts_gdf = load_states_tracts(selected_fips)
-        st.success(f"Loaded {len(tracts_gdf)} census tracts from {len(selected_states)} state(s).")
+        checker = get_zone_checker(selected_fips)
+        st.success(f"Loaded {len(checker.tracts_gdf)} census tracts from {len(selected_states)} state(s).")
     except Exception as e:
         st.error(f"Error loading census tracts: {e}")
         st.stop()
-
-# Load USDA eligibility parquet
-@st.cache_data(show_spinner="Loading USDA service...")
-@EZ_loaders.retry_loader(max_attempts=3, delay=2)
-def load_USDA_data():
-    url = "https://rdgdwe.sc.egov.usda.gov/arcgis/rest/services/Eligibility/Eligibility/MapServer/2/query"
-    # https://rdgdwe.sc.egov.usda.gov/arcgis/rest/services/Eligibility/RD_RHS_AK_OFFROAD/MapServer
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "f": "geojson"
-    }
-    resp = requests.get(url, params=params)
-    resp.raise_for_status()
-    gdf = gpd.read_file(BytesIO(resp.content), driver="geojson")
-    return gdf
-
-# TOO MUCH FOR STREAMLIT TO HANDLE
-# Load DOZ eligibility parquet
-# @st.cache_data(show_spinner="Loading DOZ service...")
-# def load_DOZ_data():
-#     url = "https://cimsprodprep.cdfifund.gov/arcgis/rest/services/PN/CIMS3_PN_View/MapServer/43/query"
-#     params = {
-#         "where": "1=1",
-#         "outFields": "*",
-#         "f": "geojson"
-#     }
-#     headers = {
-#         "User-Agent": "Mozilla/5.0 (compatible; MyApp/1.0; +https://cimsprodprep.cdfifund.gov/arcgis/rest/services/PN/CIMS3_PN_View/MapServer/43/query)"
-#     }
-#     resp = requests.get(url, params=params, headers=headers)
-#     resp.raise_for_status()
-#     gdf = gpd.read_file(BytesIO(resp.content), driver="geojson")
-#
-#     print(gdf.columns)
-#     gdf.head()
-#
-#     # Index(['OBJECTID', 'GEOID10', 'STATE', 'COUNTY', 'TRACT', 'STUSAB',
-#     #        'STATE_NAME', 'Shape__Area', 'Shape__Length', 'geometry'],
-#     #       dtype='object')
-#
-#     return gdf
-
-# Load eligibility flags CSV
-@st.cache_data
-def load_eligibility_data():
-    # read docs if needed
-    return pd.read_csv("eligibility_flags.csv", dtype={"GEOID": str})
-
-
-usda_gdf = load_USDA_data()
-eligibility_df = load_eligibility_data()
+elif national_index is not None:
+    checker = get_zone_checker(None)
+    st.info(f"No states selected: checking against all {len(national_index.geoids)} census tracts nationwide.")
 
 # Choose input method (Excel/CSV or Manual Input)
 st.subheader("Coordinates Input")
@@ -126,95 +93,65 @@ method = st.radio("Choose coordinates input method:",
                         " enter each latitude and longitude pair seperated by ___"
                   )
 
-# Function to do spatial join + merge eligibility flags
-def process_coords(df):
-
-    # Make GeoDataFrame frame from lat/lon
-    gdf = gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df.longitude, df.latitude), crs="EPSG:4326")
-    # convert gdf to crs 4269
-    gdf = gdf.to_crs(tracts_gdf.crs)
-    # Spatial join with census tracts
-    joined = gpd.sjoin(gdf, tracts_gdf, how="left", predicate="within")
-
-    unmatched = joined[joined["GEOID"].isna()]
-    if not unmatched.empty:
-        st.warning(f"{len(unmatched)} coordinate(s) did not fall within any census tract. Check your coordinates and make sure you selected the correct states.")
-        st.dataframe(unmatched[["latitude", "longitude"]])
-
-
-    # Merge eligibility data
-    results = pd.merge(joined, eligibility_df, on="GEOID", how="left")
-
-    # USDA eligibility check: join with ineligible areas
-    gdf_usda = gdf.to_crs(usda_gdf.crs)
-    usda_join = gpd.sjoin(gdf_usda, usda_gdf, how="left", predicate="within")
-
-    # If point joins with ineligible area, mark as not eligible
-    results["USDA Eligible"] = usda_join.index_right.isna()
-    results["USDA Eligible"] = results["USDA Eligible"].map({True: "Yes", False: "No"})
-
-    fips_reversed = {v: k for k, v in STATE_FIPS.items()}
-    results["State FIPS"] = results["GEOID"].str[:2]
-    results["State"] = results["State FIPS"].map(fips_reversed)
-
-    # Columns to be return regardless of selected states
-    base_cols = ["latitude", "longitude", "GEOID", "State", "NMTC Eligibility", "Opportunity Zone", "USDA Eligible"]
-
-    # Map of state fip codes to their Enterprise Zone loaders
-    state_zone_loaders = {
-        "08": [("CO Enterprise Zone", EZ_loaders.load_co_ez_data),
-               ("CO Enhanced Rural Enterprise Zone", EZ_loaders.load_co_erez_data)],
-        "12": [("FL Rural Area Opportunity Zone", EZ_loaders.load_fl_rao_data)],
-        "15": [("HI Enterprise Zone", EZ_loaders.load_hi_ez_data)],
-        "17": [("IL Enterprise Zone", EZ_loaders.load_il_ez_data)],
-        "24": [("MD Enterprise Zone", EZ_loaders.load_md_ez_data)],
-        # "29": [("MO Enhanced Enterprise Zone", EZ_loaders.load_mo_ez_data)],
-        "31": [("NE Innovation Hub", EZ_loaders.load_ne_ihub_data),
-               ("NE Enterprise Zone", EZ_loaders.load_ne_ez_data)],
-        "48": [("TX Enterprise Zone", EZ_loaders.load_tx_ez_data)],
-        "51": [("VA Enterprise Zone", EZ_loaders.load_va_ez_data)],
-    }
-
-    # Add EZ columns based on selected states
-    for fip in selected_fips:
-        if fip in state_zone_loaders:
-            for col_name, loader_func in state_zone_loaders[fip]:
-                try:
-                    zone_gdf = loader_func()
-
-                    if zone_gdf is not None:
-                        gdf_zone = gdf.to_crs(zone_gdf.crs)
-                        zone_join = gpd.sjoin(gdf_zone, zone_gdf, how="left", predicate="within")
-                        in_zone = zone_join.index_right.isna().map({True: "No", False: "Yes"})
-
-                        # N/A if coordinate is not in corresponding State
-                        point_states = results["GEOID"].str[:2] # First 2 digits = state FIPS
-                        results[col_name] = np.where(
-                            point_states == fip,
-                            in_zone, # Yes or No if point is in the same state
-                            np.nan # N/A otherwise
-                        )
-                    else:
-                        st.warning(f"{col_name} data is empty or could not be loaded")
-                except Exception as e:
-                    st.warning(f"Failed to load {col_name}: {e}")
-
-    # Build state column list
-    state_cols = [col_name
-                  for fip in selected_fips
-                  if fip in state_zone_loaders
-                  for col_name, _ in state_zone_loaders[fip]]
-
-    # Have to separately add FL Rural Job Tax Credit since it is a boolean based on GEOID
-    if "12" in selected_fips:
-        results["FL Rural Job Tax Credit Zone"] = results["GEOID"].apply(EZ_loaders.is_fl_rjtc).map({True: "Yes", False: "No"})
-        state_cols.extend(["FL Rural Job Tax Credit Zone"])
-
-    if "01" in selected_fips:
-        results["AL Enterprise Zone"] = results["GEOID"].apply(EZ_loaders.is_al_ez).map({True: "Yes", False: "No"})
-        state_cols.extend(["AL Enterprise Zone"])
-
-    return results[base_cols + state_cols]
+show_diagnostics = st.sidebar.checkbox("Show diagnostics", help="Timings, cache hits and downloads for each step")
+
+# Stage timings for the last check plus totals since the app started
+def show_diagnostics_panel(events):
+    with st.expander("Diagnostics", expanded=True):
+        stages = pd.DataFrame([e for e in events if e["type"] == "stage"])
+        if not stages.empty:
+            st.markdown("**Last check**")
+            summary = stages.groupby("name", sort=False).agg(calls=("seconds", "size"), seconds=("seconds", "sum"))
+            st.dataframe(summary.sort_values("seconds", ascending=False))
+
+        totals = metrics.snapshot()
+        if totals["stages"]:
+            st.markdown("**Since start**")
+            st.dataframe(pd.DataFrame.from_dict(totals["stages"], orient="index").sort_values("total_seconds", ascending=False))
+        if totals["counters"]:
+            st.dataframe(pd.DataFrame(totals["counters"]))
+        circuits = retries.breakers.states()
+        if circuits:
+            st.markdown("**Hosts**")
+            st.dataframe(pd.DataFrame.from_dict(circuits, orient="index"))
+        memo = get_result_memo().stats()
+        st.caption(f"Result memo: {memo['points']:,} point results in {memo['columns']} columns "
+                   f"({memo['bytes'] / 2 ** 20:.1f} MB)")
+        st.download_button("Download events (JSON lines)",
+                           "\n".join(json.dumps(e, default=str) for e in metrics.recent()),
+                           "zone_check_events.jsonl")
+
+def show_warnings(warnings):
+    for warning in warnings:
+        st.warning(warning.message)
+        if warning.code in ("unmatched_points", "rejected_rows"):
+            st.dataframe(warning.data)
+
+# Results are kept as Parquet; the other download formats are converted
+# from it in batches, once per check
+DOWNLOAD_FORMATS = {"CSV": "csv", "Parquet": "parquet", "Arrow": "arrow", "Excel": "xlsx"}
+
+# Directory for this session's result files. It is removed with the
+# session, and each new check clears out the previous one's files.
+def session_dir():
+    if "work_dir" not in st.session_state:
+        st.session_state["work_dir"] = tempfile.TemporaryDirectory(prefix="zone_check_")
+    return st.session_state["work_dir"].name
+
+def clear_session_dir():
+    directory = session_dir()
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+
+def export_results(path, fmt):
+    if fmt == "parquet":
+        return path
+    target = os.path.splitext(path)[0] + result_export.FORMATS[fmt]
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(path):
+        with st.spinner("Preparing the download..."):
+            result_export.export(path, target + ".part", fmt)
+            os.replace(target + ".part", target)
+    return target
 
 #def eligibility_polygons_gdf(tracts, eligibility):
     #joined = pd.merge(tracts, eligibility, on="GEOID", how="left")
@@ -227,119 +164,105 @@ def process_coords(df):
     #return joined
 
 results = None
+check_events = []
+map_source = None
 
 # Excel/CSV Upload Method
-if tracts_gdf is not None:
+if checker is not None:
     if method == "Upload Excel/CSV":
         uploaded_file = st.file_uploader("Upload a file with 'latitude' and 'longitude' columns",
                                          type=["csv", "xlsx"])
         if uploaded_file is not None:
             try:
-                df = pd.read_excel(uploaded_file) if uploaded_file.name.endswith(".xlsx") else pd.read_csv(uploaded_file)
-                if "latitude" in df.columns and "longitude" in df.columns:
-                    # Strip whitespace
-                    df["latitude"] = df["latitude"].astype(str).str.strip()
-                    df["longitude"] = df["longitude"].astype(str).str.strip()
-
-                    # Convert to numeric -> invalids become NaN
-                    df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
-                    df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
-
-                    # Drop rows with invalid coordinates
-                    df = df.dropna(subset=["latitude", "longitude"])
-
-                    results = process_coords(df)
-                    st.success(f"Processed {len(results)} coordinates.")
-                    st.dataframe(results)
-                    st.download_button("Download Results as CSV", results.to_csv(index=False), "eligibility_results.csv")
+                # Any widget change reruns the script; the same file against
+                # the same states reuses the last check instead of redoing it
+                check_key = (uploaded_file.file_id, tuple(selected_fips or ()))
+                last_check = st.session_state.get("last_check")
+                out_path = os.path.join(session_dir(), f"eligibility_results_{uploaded_file.file_id}.parquet")
+                rejects_path = os.path.join(session_dir(), f"rejected_rows_{uploaded_file.file_id}.csv")
+                if last_check is not None and last_check["key"] == check_key and os.path.exists(out_path):
+                    rows, results, warnings, events = last_check["output"]
                 else:
-                    st.error("Please include 'latitude' and 'longitude' columns in your file.")
+                    clear_session_dir()
+                    # Read, check and write the results chunk by chunk so large
+                    # files never have to fit in memory at once
+                    progress = st.progress(0.0, text="Checking coordinates...")
+
+                    def on_progress(rows):
+                        fraction = uploaded_file.tell() / uploaded_file.size if uploaded_file.size else 0.0
+                        progress.progress(min(fraction, 1.0), text=f"Checked {rows:,} coordinates...")
+
+                    chunks = streaming.iter_coordinate_chunks(uploaded_file, uploaded_file.name)
+                    with metrics.capture() as events:
+                        rows, results, warnings = streaming.check_stream(checker, chunks, out_path, on_progress,
+                                                                         rejects_path)
+                    progress.empty()
+                    st.session_state["last_check"] = {"key": check_key, "output": (rows, results, warnings, events)}
+
+                check_events = events
+                show_warnings(warnings)
+                st.success(f"Processed {rows} coordinates.")
+                if rows > len(results):
+                    st.caption(f"Showing the first {len(results)} rows; download the file for all of them.")
+                st.dataframe(results)
+                formats = dict(DOWNLOAD_FORMATS)
+                if rows > result_export.EXCEL_MAX_ROWS:
+                    del formats["Excel"]
+                label = st.radio("Download format", list(formats), horizontal=True)
+                fmt = formats[label]
+                with open(export_results(out_path, fmt), "rb") as f:
+                    st.download_button(f"Download Results as {label}", f,
+                                       "eligibility_results" + result_export.FORMATS[fmt],
+                                       mime=result_export.MIME_TYPES[fmt])
+                if any(warning.code == "rejected_rows" for warning in warnings):
+                    with open(rejects_path, "rb") as f:
+                        st.download_button("Download Rejected Rows as CSV", f, "rejected_rows.csv")
+                # With every row rejected the results file has no columns to map
+                if rows > 0:
+                    map_source = out_path
+            except streaming.MissingColumnsError as e:
+                st.error(str(e))
             except Exception as e:
                 st.error(f"Error processing file: {e}")
 
-#bruh
-
-# Display the coordinates on a map
-# if results is not None:
-
-    # Create eligibility polygons
-    # eligibility_polygons = eligibility_polygons_gdf(tracts_gdf, eligibility_df)
-
-    # Merge in tract geometries
-    # results_with_geom = pd.merge(results, tracts_gdf[["GEOID", "geometry"]], on="GEOID", how="left")
-
-    # Convert to GeoDataFrame
-    # Only re-wrap if it's not already a GeoDataFrame
-    # if not isinstance(results_with_geom, gpd.GeoDataFrame):
-        # results_gdf = gpd.GeoDataFrame(results_with_geom, geometry="geometry", crs="EPSG:4326")
-    # else:
-        # results_gdf = results_with_geom.to_crs(epsg=4326)
-
-    # results_gdf = results_gdf[results_gdf.geometry.is_valid]
-    # results_gdf = results_gdf[~results_gdf.geometry.is_empty]
-
-    # eligibility_polygons = eligibility_polygons[eligibility_polygons.geometry.is_valid]
-    # eligibility_polygons = eligibility_polygons[~eligibility_polygons.geometry.is_empty]
-
-    # results_gdf["geometry"] = results_gdf["geometry"].simplify(tolerance=0.0001, preserve_topology=True)
-
-    # Get center of bounding box
-    # minx, miny, maxx, maxy = usda_gdf.total_bounds
-    # center_lat = (miny + maxy) / 2
-    # center_lon = (minx + maxx) / 2
-    # #
-    # # Create the map centered on your data
-    # m = folium.Map(location=[center_lat, center_lon], zoom_start=7, tiles="CartoDB positron")
-
-    # Function to assign colors
-    # def get_color(status):
-        # if status == "Eligible":
-            # return "yellow"
-        # elif status == "Not Eligible":
-            # return "gray"
-        # elif status in ["Severe Distress", "Non-Metropolitan"]:
-            # return "red"  # light red
-        # elif status in ["Deep Distress", "High Migration Rural County"]:
-            # return "purple"
-        # else:
-            # return "white"
-
-
-    # Replace NaNs with safe values
-    # results_gdf = results_gdf.fillna("")
-    # eligibility_polygons = eligibility_polygons.fillna("")
-
-    # Create a simplified copy — DO NOT modify in place if you're using the original elsewhere
-    # simplified_polygons = eligibility_polygons[["GEOID", "geometry", "NMTC_Eligibility"]].copy()
-    # simplified_polygons["geometry"] = simplified_polygons["geometry"].simplify(0.001, preserve_topology=True)
-
-    # Optional: drop any rows that were mangled or became invalid
-    # simplified_polygons = simplified_polygons[simplified_polygons.geometry.is_valid & ~simplified_polygons.geometry.is_empty]
-
-    # Add census tracts as shaded polygons
-    # folium.GeoJson(
-    #     tez_gdf, #simplified_polygons
-    #     name = "Qualified OZs", #    name = "Census Tracts",
-    #    # style_function=lambda feature: {
-    #    #     "fillColor": get_color(feature["properties"].get("NMTC_Eligibility", None)),
-    #    #     "color" : "black",
-    #    #     "weight": 0.5,
-    #    #     "fillOpacity": 0.7,
-    #    # },
-    #    # tooltip=folium.GeoJsonTooltip(fields=["GEOID", "NMTC_Eligibility"])
-    # ).add_to(m)
-
-    # for _, rows in results.iterrows():
-    #     folium.Marker(
-    #         location=[rows.latitude, rows.longitude],
-    #         popup=rows.NAMELSAD,
-    #         icon=folium.Icon(color="blue", icon="map-marker")
-    #     ).add_to(m)
-    #
-    # #folium.Marker(
-    # #    location=[results_gdf.iloc[0]["latitude"], results_gdf.iloc[0]["longitude"]],
-    # #    popup="Test Marker"
-    # #).add_to(m)
-    #
-    # Show map
-    # st_data = st_folium(m, width=1000, height=700)
+if show_diagnostics:
+    show_diagnostics_panel(check_events)
+
+# Every checked point (not just the preview) for the map
+@st.cache_data(show_spinner=False)
+def load_map_points(path, mtime):
+    results = result_export.read_results(path, ["latitude", "longitude", "GEOID", "NMTC Eligibility",
+                                                "USDA Eligible"])
+    return map_layers.point_records(results)
+
+MAP_DETAIL = {"Country": 4, "State": 6, "County": 8, "City": 10, "Street": 12}
+
+# Display the coordinates on a map: simplified polygons for the map's
+# level of detail (see map_layers.py) under a GPU scatterplot of the points
+if map_source is not None:
+    st.subheader("Map")
+    points = load_map_points(map_source, os.path.getmtime(map_source))
+    if points.empty:
+        st.info("No coordinates fell within a census tract, so there is nothing to map.")
+    else:
+        view = map_layers.view_for(map_layers.padded_bounds(points, pad=0.05))
+        detail = st.select_slider("Map detail", options=["Auto"] + list(MAP_DETAIL), value="Auto",
+                                  help="Finer detail draws more exact polygon outlines but is slower to pan.")
+        zoom = view["zoom"] if detail == "Auto" else MAP_DETAIL[detail]
+        if len(points) == map_layers.MAX_MAP_POINTS:
+            st.caption(f"Showing a sample of {len(points):,} points.")
+
+        deck_layers = []
+        for i, (name, records) in enumerate(map_layers.polygon_layers(checker, points, zoom)):
+            tracts = name == "Census tracts"
+            deck_layers.append(pdk.Layer(
+                "PolygonLayer", records, id=name, get_polygon="polygon",
+                get_fill_color="color" if tracts else map_layers.ZONE_COLORS[i % len(map_layers.ZONE_COLORS)],
+                get_line_color=[80, 80, 80, 120], line_width_min_pixels=0.5, pickable=tracts,
+            ))
+        deck_layers.append(pdk.Layer(
+            "ScatterplotLayer", points, id="Points", get_position=["longitude", "latitude"],
+            get_fill_color="color", get_radius=30, radius_min_pixels=2, radius_max_pixels=8, pickable=True,
+        ))
+        st.pydeck_chart(pdk.Deck(layers=deck_layers, initial_view_state=pdk.ViewState(**view),
+                                 tooltip={"text": "{GEOID}\n{NMTC Eligibility}"}))
@@ -0,0 +1,284 @@
+import itertools
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import requests
+import shapely
+from requests.adapters import HTTPAdapter
+
+import metrics
+import retries
+
+# Paged ArcGIS REST queries. A single where=1=1 query is silently truncated
+# at the server's maxRecordCount, so layers are read page by page, several
+# pages at a time over one pooled session.
+MAX_WORKERS = 8
+DEFAULT_PAGE_SIZE = 1000
+# Coordinates are rounded to this many decimals (~0.1 m) in GeoJSON output.
+# Servers that support quantization send integer, delta-encoded Esri JSON
+# instead, which is several times smaller and faster to parse.
+GEOMETRY_PRECISION = 6
+# Quantization grid when the query doesn't ask for generalization (~1 cm)
+QUANTIZE_TOLERANCE = 1e-7
+WORLD_EXTENT = (-180, -90, 180, 90)
+# Send every query to another server instead, e.g. the benchmark's local
+# stand-in: https://host/path -> ZONE_ARCGIS_HOST/host/path
+HOST_OVERRIDE = os.environ.get("ZONE_ARCGIS_HOST")
+# Start of an ArcGIS error body ({"error": {...}}) sent with a 200 status
+ERROR_BODY = re.compile(rb'\s*\{\s*"error"\s*:')
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=MAX_WORKERS)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            # Some hosts (cdfifund.gov) reject the default python-requests agent
+            _session.headers["User-Agent"] = "Mozilla/5.0 (compatible; ZoneCheck/1.0)"
+    return _session
+
+
+def resolve_url(url):
+    if not HOST_OVERRIDE:
+        return url
+    parts = urlsplit(url)
+    return f"{HOST_OVERRIDE.rstrip('/')}/{parts.netloc}{parts.path}"
+
+
+def _layer_url(query_url):
+    return query_url[:-len("/query")] if query_url.endswith("/query") else query_url
+
+
+class ArcGISError(requests.HTTPError):
+    # Error reported in a 200 response body; code is ArcGIS's own error code
+    def __init__(self, message, code=None, response=None):
+        super().__init__(message, response=response)
+        self.code = code
+
+
+def _json(resp):
+    resp.raise_for_status()
+    data = resp.json()
+    # ArcGIS reports errors with a 200 status and an "error" body
+    if "error" in data:
+        error = data["error"]
+        code = error.get("code") if isinstance(error, dict) else None
+        raise ArcGISError(f"{resp.url}: {error}", code=code, response=resp)
+    return data
+
+
+def _request(method, url, **kwargs):
+    return get_session().request(method, url, timeout=retries.TIMEOUT, **kwargs)
+
+
+# GET a JSON response under the retry policy and the host's circuit breaker
+def _get_json(url, params):
+    return retries.HTTP_POLICY.run(lambda: _json(_request("get", url, params=params)), host=urlsplit(url).netloc)
+
+
+def layer_info(query_url):
+    return _get_json(_layer_url(query_url), {"f": "json"})
+
+
+# Query parameters that limit a query to features intersecting bbox
+# (minx, miny, maxx, maxy in EPSG:4326)
+def bbox_params(bbox):
+    return {
+        "geometry": ",".join(str(v) for v in bbox),
+        "geometryType": "esriGeometryEnvelope",
+        "inSR": "4326",
+        "spatialRel": "esriSpatialRelIntersects",
+    }
+
+
+def supports_quantization(info):
+    return bool(info.get("advancedQueryCapabilities", {}).get("supportsCoordinatesQuantization"))
+
+
+# Fill in the output options of a query: only the object id unless outFields
+# are given (the zone joins need nothing but the geometry), and the most
+# compact format the server offers. maxAllowableOffset is in degrees (outSR
+# is 4326) and doubles as the quantization tolerance.
+def compact_params(params, info):
+    params = {"outSR": "4326", **params}
+    params.setdefault("outFields", info.get("objectIdField") or "OBJECTID")
+    if not supports_quantization(info):
+        params["f"] = "geojson"
+        params["geometryPrecision"] = GEOMETRY_PRECISION
+        return params
+
+    offset = params.pop("maxAllowableOffset", None)
+    if params.get("geometryType") == "esriGeometryEnvelope":
+        xmin, ymin, xmax, ymax = (float(v) for v in params["geometry"].split(","))
+    else:
+        xmin, ymin, xmax, ymax = WORLD_EXTENT
+    params["f"] = "json"
+    params["quantizationParameters"] = json.dumps({
+        # view mode also drops vertices closer together than the tolerance
+        "mode": "view" if offset else "edit",
+        "originPosition": "upperLeft",
+        "tolerance": float(offset or QUANTIZE_TOLERANCE),
+        "extent": {"xmin": xmin, "ymin": ymin, "xmax": xmax, "ymax": ymax, "spatialReference": {"wkid": 4326}},
+    })
+    return params
+
+
+def _esri_crs(data):
+    spatial_reference = data.get("spatialReference") or {}
+    return f"EPSG:{spatial_reference.get('latestWkid') or spatial_reference.get('wkid') or 4326}"
+
+
+# Esri JSON polygon features -> one row per polygon (multipart features are
+# split, as normalize_layer would do anyway). Quantized responses carry a
+# transform and each ring is an absolute grid position followed by deltas.
+def esri_json_frame(data):
+    features = data.get("features") or []
+    attributes = pd.DataFrame([feature.get("attributes") or {} for feature in features])
+    rings = []
+    ring_feature = []
+    for i, feature in enumerate(features):
+        for ring in (feature.get("geometry") or {}).get("rings") or []:
+            # Rings generalized down to a line or a point are dropped
+            if len(ring) >= 4:
+                rings.append(ring)
+                ring_feature.append(i)
+    if not rings:
+        return gpd.GeoDataFrame(attributes.iloc[:0], geometry=[], crs=_esri_crs(data))
+
+    ring_feature = np.array(ring_feature)
+    lengths = np.array([len(ring) for ring in rings])
+    ring_ids = np.repeat(np.arange(len(rings)), lengths)
+    coords = np.array(list(itertools.chain.from_iterable(rings)), dtype=float)[:, :2]
+
+    transform = data.get("transform")
+    if transform:
+        starts = np.cumsum(lengths) - lengths
+        totals = np.cumsum(coords, axis=0)
+        coords = totals - (totals[starts] - coords[starts])[ring_ids]
+        (sx, sy), (tx, ty) = transform["scale"][:2], transform["translate"][:2]
+        flip = -1 if transform.get("originPosition", "upperLeft") == "upperLeft" else 1
+        coords = np.column_stack([tx + coords[:, 0] * sx, ty + flip * coords[:, 1] * sy])
+
+    geoms = shapely.linearrings(coords, indices=ring_ids)
+    # Esri outer rings are clockwise, holes counterclockwise
+    holes = shapely.is_ccw(geoms)
+    shells = np.flatnonzero(~holes)
+    owner = np.full(len(geoms), -1)
+    owner[shells] = shells
+
+    hole_idx = np.flatnonzero(holes)
+    if len(hole_idx) and len(shells):
+        # Each hole belongs to the smallest shell of its feature that contains it
+        shell_polygons = shapely.polygons(geoms[shells])
+        tree = shapely.STRtree(shell_polygons)
+        hole_pos, shell_pos = tree.query(shapely.get_point(geoms[hole_idx], 0), predicate="intersects")
+        same = ring_feature[hole_idx[hole_pos]] == ring_feature[shells[shell_pos]]
+        hole_pos, shell_pos = hole_pos[same], shell_pos[same]
+        order = np.lexsort((shapely.area(shell_polygons)[shell_pos], hole_pos))
+        hole_pos, shell_pos = hole_pos[order], shell_pos[order]
+        first = np.unique(hole_pos, return_index=True)[1]
+        owner[hole_idx[hole_pos[first]]] = shells[shell_pos[first]]
+
+    # Shell first, then its holes; holes without a shell are dropped
+    kept = np.flatnonzero(owner >= 0)
+    kept = kept[np.lexsort((holes[kept], owner[kept]))]
+    polygon_owner, polygon_ids = np.unique(owner[kept], return_inverse=True)
+    polygons = shapely.polygons(geoms[kept], indices=polygon_ids)
+    rows = attributes.iloc[ring_feature[polygon_owner]].reset_index(drop=True)
+    return gpd.GeoDataFrame(rows, geometry=polygons, crs=_esri_crs(data))
+
+
+def _read_page(query_url, params, method="get"):
+    host = urlsplit(query_url).netloc
+
+    def send():
+        if method == "post":
+            resp = _request("post", query_url, data=params)
+        else:
+            resp = _request("get", query_url, params=params)
+        if params.get("f") == "json":
+            # Parsed once here, so an error body is raised (and retried) like any other error
+            return resp, _json(resp)
+        resp.raise_for_status()
+        # GeoJSON is parsed by GDAL below; an error body would only fail there
+        # as unreadable, so it is recognised by how it starts
+        if ERROR_BODY.match(resp.content[:100]):
+            _json(resp)
+        return resp, None
+
+    with metrics.stage("arcgis.request", host=host) as record:
+        resp, data = retries.HTTP_POLICY.run(send, host=host, record=record)
+        record["status"] = resp.status_code
+        record["bytes"] = len(resp.content)
+    metrics.count("bytes_downloaded", len(resp.content), source="arcgis", host=host)
+    with metrics.stage("arcgis.parse", host=host, format=params.get("f")) as record:
+        if data is not None:
+            gdf = esri_json_frame(data)
+        else:
+            gdf = gpd.read_file(resp.content)
+        record["features"] = len(gdf)
+    return gdf
+
+
+def _page_params(query_url, params, info, page_size):
+    supports_paging = info.get("advancedQueryCapabilities", {}).get("supportsPagination", False)
+    oid_field = info.get("objectIdField") or "OBJECTID"
+
+    if supports_paging:
+        count = _get_json(query_url, {**params, "returnCountOnly": "true", "f": "json"})["count"]
+        return "get", [
+            {**params, "resultOffset": offset, "resultRecordCount": page_size, "orderByFields": oid_field}
+            for offset in range(0, count, page_size)
+        ]
+
+    # Older servers: fetch the matching object ids, then request them in chunks
+    ids = _get_json(query_url, {**params, "returnIdsOnly": "true", "f": "json"})
+    object_ids = sorted(ids.get("objectIds") or [])
+    page = {k: v for k, v in params.items() if k not in ("where", "geometry", "geometryType", "inSR", "spatialRel")}
+    return "post", [
+        {**page, "objectIds": ",".join(str(i) for i in object_ids[start:start + page_size])}
+        for start in range(0, len(object_ids), page_size)
+    ]
+
+
+def fetch_features(query_url, params, info=None, page_size=None, max_workers=MAX_WORKERS):
+    info = info if info is not None else layer_info(query_url)
+    page_size = page_size or info.get("maxRecordCount") or DEFAULT_PAGE_SIZE
+    method, pages = _page_params(query_url, compact_params(params, info), info, page_size)
+    if not pages:
+        return gpd.GeoDataFrame(geometry=[], crs="EPSG:4326")
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pages))) as pool:
+        frames = list(pool.map(lambda p: _read_page(query_url, p, method), pages))
+
+    gdf = pd.concat(frames, ignore_index=True)
+    return gpd.GeoDataFrame(gdf, geometry="geometry", crs=frames[0].crs)
+
+
+# layer_cache download hook. The layer's lastEditDate stands in for an ETag
+# since most ArcGIS servers don't send one for query results.
+def download_layer(query_url, params, validators):
+    query_url = resolve_url(query_url)
+    with metrics.stage("arcgis.download", host=urlsplit(query_url).netloc) as record:
+        info = layer_info(query_url)
+        last_edit = info.get("editingInfo", {}).get("lastEditDate")
+        if last_edit is not None and validators.get("last_edit_date") == last_edit:
+            record["modified"] = False
+            return validators, None
+        gdf = fetch_features(query_url, params, info=info)
+        record["modified"] = True
+        record["features"] = len(gdf)
+    return {"last_edit_date": last_edit}, gdf
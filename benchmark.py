@@ -0,0 +1,607 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+# Benchmark suite for the checker. A stand-in HTTP server plays both ArcGIS
+# and Hugging Face from local fixture files, the repo modules are pointed at
+# it (HF_ENDPOINT, ZONE_ARCGIS_HOST) with empty caches, and every loader and
+# every stage of a check is timed on synthetic point sets. Results are
+# written as JSON so runs on different commits can be compared:
+#
+#   python benchmark.py capture --states 12 08 48   # copy live layers once
+#   python benchmark.py run --out before.json       # (or --synthetic)
+#   python benchmark.py compare before.json after.json
+FIXTURES_DIR = Path(os.environ.get("ZONE_BENCH_FIXTURES", Path.home() / ".cache" / "zone-check" / "bench_fixtures"))
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+# FL, CO and TX cover county zones, two ArcGIS layers in one state and an HF layer
+DEFAULT_STATES = ["12", "08", "48"]
+HF_REPO = "MMNASH10/my-parquet-dataset"
+# Stand-in server page size; real servers are usually 1000-2000
+MAX_RECORD_COUNT = 2000
+# Synthetic fixtures: tracts per state (columns x rows), zones per layer and vertices per zone
+SYNTHETIC_GRID = (40, 25)
+SYNTHETIC_ZONES = 300
+SYNTHETIC_VERTICES = 500
+# Share of synthetic points placed outside every tract
+UNMATCHED_SHARE = 0.01
+RSS_SAMPLE_SECONDS = 0.005
+
+
+# -- Fixtures --
+
+def arcgis_fixture_path(directory, path):
+    # path as sent by arcgis.resolve_url: /<host>/<service path>/query
+    path = path.strip("/")
+    if path.endswith("/query"):
+        path = path[:-len("/query")]
+    return Path(directory) / "arcgis" / f"{path}.parquet"
+
+
+def hf_fixture_path(directory, filename):
+    return Path(directory) / "hf" / filename
+
+
+# Each synthetic state gets its own 5 x 2.5 degree box, laid out by FIPS code
+# inside the lower 48's bounding box so input validation lets the points through
+def synthetic_state_box(fip):
+    code = int(fip)
+    minx = -124 + (code % 10) * 5.5
+    miny = 25 + (code // 10) * 3
+    return minx, miny, minx + 5, miny + 2.5
+
+
+def synthetic_tracts(fip, grid=SYNTHETIC_GRID):
+    import eligibility_index
+
+    cols, rows = grid
+    minx, miny, maxx, maxy = synthetic_state_box(fip)
+    xs = np.linspace(minx, maxx, cols + 1)
+    ys = np.linspace(miny, maxy, rows + 1)
+    x0, y0 = np.meshgrid(xs[:-1], ys[:-1])
+    x1, y1 = np.meshgrid(xs[1:], ys[1:])
+    geoms = shapely.box(x0.ravel(), y0.ravel(), x1.ravel(), y1.ravel())
+
+    # Real GEOIDs for the state where there are enough, so the eligibility
+    # and county lookups hit
+    flags = pd.read_csv(eligibility_index.CSV_PATH, dtype={"GEOID": str}, usecols=["GEOID"])
+    geoids = sorted(flags.loc[flags["GEOID"].str[:2] == fip, "GEOID"])[:len(geoms)]
+    geoids += [f"{fip}999{i:06d}" for i in range(len(geoms) - len(geoids))]
+    return gpd.GeoDataFrame({"GEOID": geoids}, geometry=geoms, crs="EPSG:4269")
+
+
+# Irregular blobs with densely spaced vertices, like digitized zone boundaries
+def synthetic_zones(name, states, count=SYNTHETIC_ZONES, vertices=SYNTHETIC_VERTICES):
+    seed = int(hashlib.sha256(name.encode()).hexdigest()[:8], 16)
+    rng = np.random.default_rng(seed)
+    boxes = np.array([synthetic_state_box(fip) for fip in states])
+    state = rng.integers(0, len(boxes), count)
+    radius = rng.uniform(0.03, 0.2, count)
+    cx = rng.uniform(boxes[state, 0] + radius, boxes[state, 2] - radius)
+    cy = rng.uniform(boxes[state, 1] + radius, boxes[state, 3] - radius)
+
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    # Smooth random wobble in the radius (a few low harmonics)
+    wobble = sum(rng.uniform(0, 0.15, (count, 1)) * np.cos(k * angles + rng.uniform(0, 2 * np.pi, (count, 1)))
+                 for k in range(2, 6))
+    r = radius[:, None] * (1 + wobble)
+    coords = np.stack([cx[:, None] + r * np.cos(angles), cy[:, None] + r * np.sin(angles)], axis=-1)
+    coords = np.concatenate([coords, coords[:, :1]], axis=1)
+    return gpd.GeoDataFrame({"OBJECTID": np.arange(1, count + 1)}, geometry=shapely.polygons(coords), crs="EPSG:4326")
+
+
+# Copy the live layers for states into directory, by loading them once
+# through the normal loaders with empty caches
+def capture(directory, states):
+    directory = Path(directory)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        os.environ["ZONE_CACHE_DIR"] = cache_dir
+        import zone_checker
+
+        checker = zone_checker.ZoneChecker(states).load()
+        for warning in checker.load_warnings:
+            print(warning.message)
+
+        # Layer cache entries -> one fixture per query URL (the USDA layer
+        # is fetched once per state bbox)
+        by_url = {}
+        for meta_file in Path(cache_dir).glob("*.json"):
+            with open(meta_file) as f:
+                meta = json.load(f)
+            by_url.setdefault(meta["url"], []).append(gpd.read_parquet(meta_file.with_suffix(".parquet")))
+        for url, parts in by_url.items():
+            gdf = pd.concat(parts, ignore_index=True)
+            gdf = gdf[~gdf.geometry.to_wkb().duplicated()].reset_index(drop=True)
+            gdf["OBJECTID"] = np.arange(1, len(gdf) + 1)
+            split = urlsplit(url)
+            path = arcgis_fixture_path(directory, f"/{split.netloc}{split.path}")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            gdf.to_parquet(path)
+            print(f"{url} -> {path} ({len(gdf)} features)")
+
+    from huggingface_hub import hf_hub_download
+
+    filenames = [f"tl_2024_{fip}_tract.parquet" for fip in states]
+    if "48" in states:
+        filenames.append("TEZ_2020_complete.parquet")
+    for filename in filenames:
+        path = hf_fixture_path(directory, filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(hf_hub_download(repo_id=HF_REPO, filename=filename, repo_type="dataset"), path)
+        print(f"{filename} -> {path}")
+
+
+# -- Stand-in server --
+
+class FixtureStore:
+    # Fixture layers by request path, read (or generated, with
+    # synthetic_states) on first use
+
+    def __init__(self, directory, synthetic_states=None):
+        self.directory = Path(directory)
+        self.synthetic_states = synthetic_states
+        self._layers = {}
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def layer(self, path):
+        with self._lock:
+            if path not in self._layers:
+                fixture = arcgis_fixture_path(self.directory, path)
+                if fixture.exists():
+                    gdf = gpd.read_parquet(fixture).to_crs("EPSG:4326")
+                elif self.synthetic_states:
+                    gdf = synthetic_zones(path, self.synthetic_states)
+                else:
+                    gdf = None
+                if gdf is not None:
+                    gdf = gdf.reset_index(drop=True)
+                    gdf.sindex
+                self._layers[path] = gdf
+            return self._layers[path]
+
+    def file(self, filename):
+        with self._lock:
+            if filename not in self._files:
+                fixture = hf_fixture_path(self.directory, filename)
+                if fixture.exists():
+                    data = fixture.read_bytes()
+                elif self.synthetic_states and filename.startswith("tl_2024_"):
+                    buf = BytesIO()
+                    synthetic_tracts(filename.split("_")[2]).to_parquet(buf)
+                    data = buf.getvalue()
+                elif self.synthetic_states:
+                    buf = BytesIO()
+                    synthetic_zones(filename, self.synthetic_states).to_parquet(buf)
+                    data = buf.getvalue()
+                else:
+                    data = None
+                self._files[filename] = data
+            return self._files[filename]
+
+
+# Esri JSON for the rows of gdf, quantized and delta encoded like ArcGIS
+# does when the query has quantizationParameters
+def esri_json(gdf, quantization=None):
+    features = []
+    for oid, geom in zip(gdf["OBJECTID"].tolist(), shapely.orient_polygons(gdf.geometry.values, exterior_cw=True)):
+        rings = []
+        for polygon in shapely.get_parts(geom):
+            for ring in [polygon.exterior, *polygon.interiors]:
+                xy = shapely.get_coordinates(ring)
+                if quantization is not None:
+                    grid = np.column_stack([np.round((xy[:, 0] - quantization["extent"]["xmin"]) / quantization["tolerance"]),
+                                            np.round((quantization["extent"]["ymax"] - xy[:, 1]) / quantization["tolerance"])])
+                    deltas = np.vstack([grid[:1], np.diff(grid, axis=0)])
+                    keep = np.any(deltas != 0, axis=1)
+                    keep[0] = True
+                    xy = deltas[keep].astype(np.int64)
+                rings.append(xy.tolist())
+        features.append({"attributes": {"OBJECTID": oid}, "geometry": {"rings": rings}})
+
+    data = {"objectIdFieldName": "OBJECTID", "spatialReference": {"wkid": 4326}, "features": features}
+    if quantization is not None:
+        data["transform"] = {
+            "originPosition": "upperLeft",
+            "scale": [quantization["tolerance"], quantization["tolerance"], 0, 0],
+            "translate": [quantization["extent"]["xmin"], quantization["extent"]["ymax"], 0, 0],
+        }
+    return data
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    store = None
+    quantization = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, content_type="application/json", status=200, headers=None, head=False):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    # Hugging Face file download: /datasets/<repo>/resolve/<revision>/<filename>
+    def _hf(self, path, head):
+        filename = path.rsplit("/", 1)[-1]
+        data = self.store.file(filename)
+        if data is None:
+            return self._send({"error": "not found"}, status=404, headers={"X-Error-Code": "EntryNotFound"}, head=head)
+        digest = hashlib.sha256(data).hexdigest()
+        self._send(data, "application/octet-stream", head=head,
+                   headers={"ETag": f'"{digest}"', "X-Repo-Commit": digest[:40]})
+
+    def _arcgis(self, path, query):
+        gdf = self.store.layer(path if path.endswith("/query") else path + "/query")
+        if gdf is None:
+            return self._send({"error": {"code": 400, "message": f"No fixture for {path}"}})
+        if not path.endswith("/query"):
+            return self._send({"maxRecordCount": MAX_RECORD_COUNT, "objectIdField": "OBJECTID",
+                               "advancedQueryCapabilities": {"supportsPagination": True,
+                                                             "supportsCoordinatesQuantization": self.quantization},
+                               "editingInfo": {"lastEditDate": 0}})
+
+        if "objectIds" in query:
+            ids = np.array([int(i) for i in query["objectIds"].split(",")])
+            rows = np.flatnonzero(np.isin(gdf["OBJECTID"].to_numpy(), ids))
+        elif query.get("geometryType") == "esriGeometryEnvelope":
+            bbox = shapely.box(*[float(v) for v in query["geometry"].split(",")])
+            rows = np.sort(gdf.sindex.query(bbox, predicate="intersects"))
+        else:
+            rows = np.arange(len(gdf))
+
+        if query.get("returnCountOnly") == "true":
+            return self._send({"count": len(rows)})
+        if query.get("returnIdsOnly") == "true":
+            return self._send({"objectIdFieldName": "OBJECTID", "objectIds": gdf["OBJECTID"].to_numpy()[rows].tolist()})
+        if "resultOffset" in query:
+            offset = int(query["resultOffset"])
+            rows = rows[offset:offset + int(query.get("resultRecordCount", MAX_RECORD_COUNT))]
+        if query.get("f") == "json":
+            quantization = json.loads(query["quantizationParameters"]) if "quantizationParameters" in query else None
+            return self._send(esri_json(gdf.iloc[rows], quantization))
+        page = gdf.iloc[rows]
+        if "geometryPrecision" in query:
+            precision = int(query["geometryPrecision"])
+            page = page.set_geometry(shapely.transform(page.geometry.values, lambda xy: np.round(xy, precision)))
+        self._send(page.to_json().encode(), "application/geo+json")
+
+    def _route(self, query, head=False):
+        path = urlsplit(self.path).path
+        if path.startswith("/datasets/"):
+            return self._hf(path, head)
+        return self._arcgis(path, query)
+
+    def do_HEAD(self):
+        self._route({}, head=True)
+
+    def do_GET(self):
+        self._route({k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        self._route({k: v[0] for k, v in parse_qs(body).items()})
+
+
+# quantization=False plays an older server that only has GeoJSON
+def serve(directory, synthetic_states=None, port=0, on_ready=None, quantization=True):
+    FixtureHandler.store = FixtureStore(directory, synthetic_states)
+    FixtureHandler.quantization = quantization
+    server = ThreadingHTTPServer(("127.0.0.1", port), FixtureHandler)
+    if on_ready is not None:
+        on_ready(server.server_address[1])
+    server.serve_forever()
+
+
+def _serve_child(directory, synthetic_states, quantization, ready):
+    serve(directory, synthetic_states, on_ready=ready.put, quantization=quantization)
+
+
+# Run the stand-in server in its own process so it doesn't count towards
+# the benchmark's CPU time and RSS. Returns (process, base url).
+def start_server(directory, synthetic_states=None, quantization=True):
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    process = context.Process(target=_serve_child, args=(str(directory), synthetic_states, quantization, ready),
+                              daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{ready.get(timeout=60)}"
+
+
+# -- Measurement --
+
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        # Peak rather than current where /proc is missing; kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler:
+    # Highest RSS seen while the stage runs, sampled on a background thread
+
+    def __init__(self):
+        self.start = self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+# Run func(*args) as stage `name`, record wall time, peak RSS and
+# points/sec (if points is given) in stages, and return func's result
+def measure(stages, name, points, func, *args):
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        value = func(*args)
+        seconds = time.perf_counter() - start
+    stages[name] = {
+        "seconds": round(seconds, 6),
+        "peak_rss_mb": round(rss.peak / 2 ** 20, 1),
+        "rss_delta_mb": round((rss.peak - rss.start) / 2 ** 20, 1),
+    }
+    if points:
+        stages[name]["points_per_sec"] = round(points / seconds, 1) if seconds else None
+    return value
+
+
+# -- Benchmarks --
+
+# Every loader a check of states needs, timed one by one
+def bench_loaders(states):
+    import EZ_loaders
+    import eligibility_index
+    import zone_checker
+
+    stages = {}
+    for fip in states:
+        tracts = measure(stages, f"Census tracts ({zone_checker.FIPS_STATES[fip]})", None,
+                         zone_checker.load_state_tracts, fip)
+        bbox = tuple(tracts.to_crs("EPSG:4326").total_bounds)
+        measure(stages, f"USDA ineligible areas ({zone_checker.FIPS_STATES[fip]})", None,
+                EZ_loaders.load_usda_data, bbox)
+    measure(stages, "Eligibility flags", None, eligibility_index.load_eligibility_index)
+    for _, col_name, loader_func in zone_checker.ZoneChecker(states).zone_columns():
+        measure(stages, col_name, None, loader_func)
+    return stages
+
+
+def _forget_loaded_layers():
+    import EZ_loaders
+    import layer_cache
+    import zone_checker
+
+    with layer_cache._lock:
+        layer_cache._memory.clear()
+    for func in (EZ_loaders.load_tx_ez_data, zone_checker.load_state_tracts):
+        func.cache_clear()
+
+
+def synthetic_points(tracts_gdf, n, seed=0):
+    rng = np.random.default_rng(seed)
+    bounds = tracts_gdf.to_crs("EPSG:4326").geometry.bounds.to_numpy()
+    tract = rng.integers(0, len(bounds), n)
+    lon = rng.uniform(bounds[tract, 0], bounds[tract, 2])
+    lat = rng.uniform(bounds[tract, 1], bounds[tract, 3])
+    # A few points just east of every tract: valid US coordinates that still
+    # go through the joins without a match
+    outside = rng.random(n) < UNMATCHED_SHARE
+    lon[outside] = bounds[:, 2].max() + rng.uniform(0.1, 0.4, outside.sum())
+    return pd.DataFrame({"latitude": lat, "longitude": lon})
+
+
+# Each step of ZoneChecker.check timed separately on n points, then the
+# whole check and the CSV and Parquet exports
+def bench_points(checker, n, workdir, seed=0):
+    import eligibility_index
+    import result_export
+    import streaming
+
+    csv_path = Path(workdir) / f"points_{n}.csv"
+    synthetic_points(checker.tracts_gdf, n, seed).to_csv(csv_path, index=False)
+
+    stages = {}
+    df = measure(stages, "parse", n, lambda: streaming.read_coordinates(csv_path)[0].reset_index(drop=True))
+
+    def reproject():
+        project = checker._projector(df)
+        project(checker.tracts_gdf.crs)
+        return project
+    project = measure(stages, "reproject", n, reproject)
+    geoids = measure(stages, "tract join", n, checker._tract_geoids, df, project)
+    measure(stages, "eligibility merge", n, checker.eligibility.lookup, geoids)
+
+    everywhere = np.arange(len(df))
+    if checker.usda_gdf is not None:
+        measure(stages, "USDA Eligible", n, checker._in_layer, "USDA Eligible", checker.usda_gdf, project, geoids,
+                everywhere)
+    point_states = eligibility_index.state_codes(geoids)
+    for fip, col_name, _ in checker.zone_columns():
+        layer = checker.zone_layers.get(col_name)
+        if layer is not None:
+            rows = np.flatnonzero(point_states == int(fip))
+            measure(stages, col_name, n, checker._in_layer, col_name, layer, project, geoids, rows)
+    for _, col_name, table in checker.county_columns():
+        measure(stages, col_name, n, eligibility_index.in_counties, table, geoids)
+
+    checker.memo.clear()
+    results, _ = measure(stages, "check (total)", n, checker.check, df)
+    # Same points again: every result comes from the memo
+    measure(stages, "check (memoized)", n, checker.check, df)
+    for fmt in ("csv", "parquet"):
+        path = Path(workdir) / f"results_{n}{result_export.FORMATS[fmt]}"
+        measure(stages, f"{fmt.upper()} export", n, result_export.write_results, results, path)
+    return stages
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                                cwd=Path(__file__).parent).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, cwd=Path(__file__).parent).stdout.strip() != ""
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def run(states, sizes, fixtures_dir=FIXTURES_DIR, synthetic=False, seed=0, quantization=True):
+    if "zone_checker" in sys.modules:
+        raise RuntimeError("run() must be called before the repo modules are imported")
+
+    server, url = start_server(fixtures_dir, states if synthetic else None, quantization)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            # Empty caches, every download goes to the stand-in server. Read
+            # at import time, hence the imports below.
+            os.environ["HF_ENDPOINT"] = url
+            os.environ["HF_HUB_CACHE"] = str(Path(workdir) / "hf")
+            os.environ["HF_HUB_DISABLE_TELEMETRY"] = "1"
+            os.environ["ZONE_CACHE_DIR"] = str(Path(workdir) / "layers")
+            os.environ["ZONE_ARCGIS_HOST"] = url
+            import zone_checker
+
+            report = {
+                "commit": None,
+                "dirty": None,
+                "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "states": states,
+                "fixtures": "synthetic" if synthetic else str(fixtures_dir),
+                "seed": seed,
+                "quantization": quantization,
+            }
+            report["commit"], report["dirty"] = _git_commit()
+
+            print("Loaders (cold caches)...", file=sys.stderr)
+            report["loaders_cold"] = bench_loaders(states)
+            _forget_loaded_layers()
+            print("Loaders (disk cache)...", file=sys.stderr)
+            report["loaders_warm"] = bench_loaders(states)
+
+            checker = zone_checker.ZoneChecker(states).load()
+            for warning in checker.load_warnings:
+                print(warning.message, file=sys.stderr)
+            report["points"] = {}
+            for n in sizes:
+                print(f"{n} points...", file=sys.stderr)
+                report["points"][str(n)] = bench_points(checker, n, workdir, seed)
+    finally:
+        server.terminate()
+    return report
+
+
+# Print seconds per stage for two reports side by side
+def compare(old, new):
+    sections = [("loaders_cold", None), ("loaders_warm", None)]
+    sections += [("points", size) for size in new.get("points", {})]
+    print(f"{'stage':<52}{'old s':>10}{'new s':>10}{'new/old':>9}")
+    for section, size in sections:
+        old_stages = old.get(section, {})
+        new_stages = new.get(section, {})
+        if size is not None:
+            old_stages = old_stages.get(size, {})
+            new_stages = new_stages.get(size, {})
+        print(f"-- {section}" + (f" ({size})" if size else ""))
+        for name, stats in new_stages.items():
+            before = old_stages.get(name, {}).get("seconds")
+            after = stats["seconds"]
+            ratio = f"{after / before:.2f}" if before else "-"
+            before = f"{before:.4f}" if before is not None else "-"
+            print(f"{name:<52}{before:>10}{after:>10.4f}{ratio:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the loaders and every stage of a check.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="run the benchmarks against the fixtures")
+    run_parser.add_argument("--states", nargs="*", default=DEFAULT_STATES, help="state FIPS codes")
+    run_parser.add_argument("--sizes", nargs="*", type=int, default=DEFAULT_SIZES, help="point set sizes")
+    run_parser.add_argument("--fixtures", default=str(FIXTURES_DIR))
+    run_parser.add_argument("--synthetic", action="store_true",
+                            help="generate tracts and zone layers for missing fixtures")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--geojson", action="store_true", help="server without coordinate quantization")
+    run_parser.add_argument("--out", default=None, help="JSON report path (default: bench-<commit>.json)")
+
+    capture_parser = sub.add_parser("capture", help="copy the live layers for states into the fixtures directory")
+    capture_parser.add_argument("--states", nargs="*", default=DEFAULT_STATES)
+    capture_parser.add_argument("--fixtures", default=str(FIXTURES_DIR))
+
+    serve_parser = sub.add_parser("serve", help="only run the stand-in server")
+    serve_parser.add_argument("--fixtures", default=str(FIXTURES_DIR))
+    serve_parser.add_argument("--synthetic", nargs="*", default=None, metavar="FIPS",
+                              help="generate layers for these states when a fixture is missing")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--geojson", action="store_true", help="no coordinate quantization")
+
+    compare_parser = sub.add_parser("compare", help="compare two JSON reports")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        report = run(args.states, args.sizes, args.fixtures, args.synthetic, args.seed, not args.geojson)
+        out = args.out or f"bench-{(report['commit'] or 'unknown')[:10]}.json"
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {out}")
+    elif args.command == "capture":
+        capture(args.fixtures, args.states)
+    elif args.command == "serve":
+        print(f"Serving {args.fixtures} on http://127.0.0.1:{args.port} "
+              f"(set HF_ENDPOINT and ZONE_ARCGIS_HOST to this URL)")
+        serve(args.fixtures, args.synthetic, args.port, quantization=not args.geojson)
+    else:
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        compare(old, new)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+CSV_PATH = Path(__file__).parent / "eligibility_flags.csv"
+FLAG_COLS = ["NMTC Eligibility", "Opportunity Zone"]
+
+# GEOID = 2 digit state + 3 digit county + 6 digit tract
+COUNTY_DIVISOR = 10 ** 6
+STATE_DIVISOR = 10 ** 9
+MISSING = -1
+
+
+# GEOID strings (None/NaN allowed) -> int64 with MISSING for blanks
+def geoid_ints(geoids):
+    values = pd.to_numeric(pd.Series(geoids, dtype=object), errors="coerce")
+    return values.fillna(MISSING).to_numpy(dtype=np.int64)
+
+
+def geoid_strings(ints):
+    if len(ints) == 0:
+        # np.char.zfill fails on an empty array
+        return pd.Series([], dtype=object)
+    strings = pd.Series(np.char.zfill(ints.astype(str), 11), dtype=object)
+    strings[ints == MISSING] = None
+    return strings
+
+
+def state_codes(ints):
+    return np.where(ints == MISSING, MISSING, ints // STATE_DIVISOR)
+
+
+# Boolean lookup table indexed by the 5 digit county FIPS number
+def county_table(counties):
+    table = np.zeros(10 ** 5, dtype=bool)
+    table[[int(c) for c in counties]] = True
+    return table
+
+
+def in_counties(table, ints):
+    counties = np.where(ints == MISSING, 0, ints // COUNTY_DIVISOR)
+    return table[counties] & (ints != MISSING)
+
+
+class EligibilityIndex:
+    # Tract eligibility flags keyed by int64 GEOID (sorted) with each flag
+    # stored as categorical codes, so a lookup is a searchsorted plus array
+    # indexing instead of a string merge.
+
+    def __init__(self, geoids, codes, categories):
+        self.geoids = geoids
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def from_frame(cls, df):
+        df = df.drop_duplicates("GEOID")
+        ints = geoid_ints(df["GEOID"])
+        order = np.argsort(ints, kind="stable")
+        codes = {}
+        categories = {}
+        for col in FLAG_COLS:
+            flags = pd.Categorical(df[col].to_numpy()[order])
+            codes[col] = flags.codes
+            categories[col] = list(flags.categories)
+        return cls(ints[order], codes, categories)
+
+    @classmethod
+    def read(cls, path):
+        table = pq.read_table(path, memory_map=True)
+        df = table.to_pandas()
+        codes = {col: df[col].cat.codes.to_numpy() for col in FLAG_COLS}
+        categories = {col: list(df[col].cat.categories) for col in FLAG_COLS}
+        return cls(df["GEOID"].to_numpy(dtype=np.int64), codes, categories)
+
+    def save(self, path):
+        df = pd.DataFrame({"GEOID": self.geoids})
+        for col in FLAG_COLS:
+            df[col] = pd.Categorical.from_codes(self.codes[col], self.categories[col])
+        df.to_parquet(path, index=False)
+
+    # Flags for each int64 GEOID in ints, as a DataFrame of categoricals
+    def lookup(self, ints):
+        ints = np.asarray(ints, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.geoids, ints), len(self.geoids) - 1)
+        found = (self.geoids[pos] == ints) & (ints != MISSING)
+        return pd.DataFrame({
+            col: pd.Categorical.from_codes(np.where(found, self.codes[col][pos], -1), self.categories[col])
+            for col in FLAG_COLS
+        })
+
+
+# Load the index from its parquet copy, (re)building it from the CSV when
+# the parquet file is missing or older than the CSV
+def load_eligibility_index(csv_path=CSV_PATH):
+    csv_path = Path(csv_path)
+    parquet_path = csv_path.with_suffix(".parquet")
+    if parquet_path.exists() and os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path):
+        return EligibilityIndex.read(parquet_path)
+
+    index = EligibilityIndex.from_frame(pd.read_csv(csv_path, dtype={"GEOID": str}))
+    try:
+        index.save(parquet_path)
+    except OSError as e:
+        logger.warning("Could not write %s: %s", parquet_path, e)
+    return index
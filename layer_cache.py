@@ -0,0 +1,251 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+import geopandas as gpd
+import requests
+
+import metrics
+import retries
+
+logger = logging.getLogger(__name__)
+
+# Disk cache for downloaded zone layers. Each layer is stored as GeoParquet
+# next to a small JSON sidecar (ETag, Last-Modified, fetch time), keyed by
+# the URL and query parameters. A cache hit only touches the parquet file's
+# mtime, which eviction uses as the last access time, so many processes can
+# read the cache at once without rewriting the sidecar. Returned layers carry a version in
+# gdf.attrs["version"] that changes only when new data is downloaded, so
+# results computed against a layer can be reused until then.
+CACHE_DIR = Path(os.environ.get("ZONE_CACHE_DIR", Path.home() / ".cache" / "zone-check" / "layers"))
+MAX_CACHE_BYTES = int(os.environ.get("ZONE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# Offline mode never touches the network if a cached copy exists
+OFFLINE = os.environ.get("ZONE_CACHE_OFFLINE", "0") == "1"
+
+# Bump when the stored layer format changes so old entries are ignored
+CACHE_FORMAT = 2
+
+# Every layer is stored in one CRS so points are never reprojected per layer
+CANONICAL_CRS = "EPSG:4326"
+# Zone polygons are simplified to ~1 m (in degrees); 0 turns it off
+SIMPLIFY_TOLERANCE = float(os.environ.get("ZONE_SIMPLIFY_TOLERANCE", 1e-5))
+
+HOUR = 3600
+DAY = 24 * HOUR
+DEFAULT_TTL = DAY
+# How long a stale copy is served after the upstream host failed before we try again
+STALE_RETRY_SECONDS = 5 * 60
+
+# In-process copies so repeated calls don't re-read the parquet file
+_memory = {}
+_lock = threading.Lock()
+
+
+def cache_key(url, params=None):
+    raw = json.dumps([CACHE_FORMAT, url, sorted((params or {}).items())], default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def _data_path(key):
+    return CACHE_DIR / f"{key}.parquet"
+
+
+def _meta_path(key):
+    return CACHE_DIR / f"{key}.json"
+
+
+def _read_meta(key):
+    try:
+        with open(_meta_path(key)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Atomic replace through a temp file of our own, so concurrent writers
+# never share (or truncate) one
+def _write_json(path, data):
+    with tempfile.NamedTemporaryFile("w", dir=path.parent, suffix=".tmp", delete=False) as f:
+        json.dump(data, f)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+
+# A sidecar update that fails only costs a refetch later; it never fails the read
+def _update_meta(key, meta):
+    try:
+        _write_json(_meta_path(key), meta)
+    except OSError as e:
+        logger.warning("Could not update cache metadata for %s: %s", key, e)
+
+
+def _read_cached(key, meta):
+    with metrics.stage("layer_cache.read", bytes=meta.get("size")) as record:
+        gdf = gpd.read_parquet(_data_path(key), memory_map=True)
+        record["features"] = len(gdf)
+    # Entries written before versions existed get one now
+    meta.setdefault("version", _version(key, meta["fetched_at"]))
+    try:
+        # Last access, for eviction
+        os.utime(_data_path(key))
+    except OSError:
+        pass
+    return gdf
+
+
+def _store(key, meta, gdf):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _data_path(key).with_suffix(".parquet.tmp")
+    gdf.to_parquet(tmp)
+    os.replace(tmp, _data_path(key))
+    meta["size"] = _data_path(key).stat().st_size
+    _update_meta(key, meta)
+    evict()
+
+
+# Ingestion step run once when a layer enters the cache: canonical CRS,
+# valid geometries, multipart shapes split into single polygons and a light
+# simplification. Tracts use explode=False and no simplification so each
+# GEOID stays one row and shared boundaries stay exact.
+def normalize_layer(gdf, simplify_tolerance=SIMPLIFY_TOLERANCE, explode=True):
+    if gdf.crs is None:
+        # GeoJSON is always WGS84
+        gdf = gdf.set_crs(CANONICAL_CRS)
+    gdf = gdf.to_crs(CANONICAL_CRS)
+    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty].copy()
+    invalid = ~gdf.geometry.is_valid
+    if invalid.any():
+        gdf.loc[invalid, "geometry"] = gdf.geometry[invalid].make_valid()
+    if explode:
+        gdf = gdf.explode(ignore_index=True)
+        # make_valid can leave stray lines/points in collections
+        gdf = gdf[gdf.geom_type == "Polygon"]
+    if simplify_tolerance:
+        gdf["geometry"] = gdf.geometry.simplify(simplify_tolerance, preserve_topology=True)
+    return gdf.reset_index(drop=True)
+
+
+def _version(key, fetched_at):
+    return f"{key}@{int(fetched_at)}"
+
+
+def _remember(key, gdf, expires_at, version):
+    gdf.attrs["version"] = version
+    # Build the spatial index now, on the loader thread, not on the first check
+    gdf.sindex
+    with _lock:
+        _memory[key] = (expires_at, gdf)
+    return gdf
+
+
+# Drop least recently used layers until the cache fits in MAX_CACHE_BYTES
+def evict(max_bytes=None):
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for meta_file in CACHE_DIR.glob("*.json"):
+        meta = _read_meta(meta_file.stem)
+        if meta is not None and _data_path(meta_file.stem).exists():
+            try:
+                accessed_at = _data_path(meta_file.stem).stat().st_mtime
+            except OSError:
+                continue
+            entries.append((accessed_at, meta.get("size", 0), meta_file.stem))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, key in sorted(entries):
+        if total <= max_bytes:
+            break
+        for path in (_data_path(key), _meta_path(key)):
+            path.unlink(missing_ok=True)
+        with _lock:
+            _memory.pop(key, None)
+        total -= size
+        logger.info("Evicted cached layer %s (%d bytes)", key, size)
+
+
+def clear():
+    with _lock:
+        _memory.clear()
+    for path in list(CACHE_DIR.glob("*.parquet")) + list(CACHE_DIR.glob("*.json")):
+        path.unlink(missing_ok=True)
+
+
+# Plain single request download. Download hooks take the validators saved
+# with the cached copy and return (validators, gdf), with gdf None when the
+# cached copy is still current.
+def _download(url, params, validators):
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    resp = requests.get(url, params=params, headers=headers, timeout=retries.TIMEOUT)
+    if resp.status_code == 304:
+        return validators, None
+    resp.raise_for_status()
+    validators = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+    return validators, gpd.read_file(BytesIO(resp.content))
+
+
+# Return the layer at url/params, downloading it only when the cached copy is
+# older than ttl. Expired copies are revalidated (ETag/Last-Modified, or
+# whatever the download hook uses), and a stale copy is served if the
+# upstream host can't be reached.
+def fetch_layer(url, params=None, ttl=DEFAULT_TTL, download=_download):
+    key = cache_key(url, params)
+    now = time.time()
+
+    with _lock:
+        remembered = _memory.get(key)
+    if remembered is not None and remembered[0] > now:
+        metrics.count("layer_cache", result="memory")
+        return remembered[1]
+
+    meta = _read_meta(key)
+    cached = meta is not None and _data_path(key).exists()
+    if cached and (OFFLINE or now - meta["fetched_at"] < ttl):
+        metrics.count("layer_cache", result="disk")
+        gdf = _read_cached(key, meta)
+        return _remember(key, gdf, meta["fetched_at"] + ttl, meta["version"])
+
+    try:
+        validators, gdf = download(url, params, meta.get("validators", {}) if cached else {})
+    except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+        status = getattr(e.response, "status_code", None)
+        if not cached or (status is not None and status < 500):
+            raise
+        logger.warning("Serving stale copy of %s: %s", url, e)
+        metrics.count("layer_cache", result="stale")
+        gdf = _read_cached(key, meta)
+        return _remember(key, gdf, now + STALE_RETRY_SECONDS, meta["version"])
+
+    if gdf is None:
+        # Not modified
+        metrics.count("layer_cache", result="revalidated")
+        meta["fetched_at"] = now
+        _update_meta(key, meta)
+        gdf = _read_cached(key, meta)
+        return _remember(key, gdf, now + ttl, meta["version"])
+
+    metrics.count("layer_cache", result="miss")
+    with metrics.stage("layer_cache.normalize", features=len(gdf)):
+        gdf = normalize_layer(gdf)
+    meta = {
+        "url": url,
+        "params": params,
+        "validators": validators,
+        "fetched_at": now,
+        "version": _version(key, now),
+    }
+    _store(key, meta, gdf)
+    return _remember(key, gdf, now + ttl, meta["version"])
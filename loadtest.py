@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+import numpy as np
+
+# Local load generator for service.py: `concurrency` clients send single
+# point /check requests (or /check/batch with --batch N) as fast as they
+# can for `duration` seconds, then client-side and server-side latency
+# percentiles are printed.
+
+# Rough continental US box for random points
+US_BOUNDS = (-124.7, 24.5, -66.9, 49.4)
+
+
+def random_points(n, bounds=US_BOUNDS, seed=None):
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = bounds
+    return np.column_stack([rng.uniform(miny, maxy, n), rng.uniform(minx, maxx, n)])
+
+
+async def _client(session, url, batch, deadline, latencies, errors, seed):
+    points = random_points(10_000, seed=seed)
+    i = 0
+    while time.perf_counter() < deadline:
+        chunk = points[i % len(points): i % len(points) + batch]
+        i += batch
+        if batch == 1:
+            path, body = "/check", {"latitude": chunk[0][0], "longitude": chunk[0][1]}
+        else:
+            path, body = "/check/batch", {"points": [{"latitude": lat, "longitude": lon} for lat, lon in chunk]}
+        start = time.perf_counter()
+        try:
+            async with session.post(url + path, json=body) as resp:
+                await resp.read()
+                if resp.status != 200:
+                    errors.append(resp.status)
+                    continue
+        except aiohttp.ClientError as e:
+            errors.append(str(e))
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run(url, concurrency, duration, batch):
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[_client(session, url, batch, deadline, latencies, errors, seed)
+                               for seed in range(concurrency)])
+        async with session.get(url + "/metrics") as resp:
+            server = await resp.json()
+
+    values = np.array(latencies) if latencies else np.array([np.nan])
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_sec": round(len(latencies) / duration, 1),
+        "points_per_sec": round(len(latencies) * batch / duration, 1),
+        "client_p50_ms": round(float(np.percentile(values, 50)), 3),
+        "client_p99_ms": round(float(np.percentile(values, 99)), 3),
+        "server": server,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the zone lookup service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--batch", type=int, default=1, help="points per request (1 = /check)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.url.rstrip("/"), args.concurrency, args.duration, args.batch))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
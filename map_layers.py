@@ -0,0 +1,185 @@
+import math
+import threading
+from collections import OrderedDict
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+import eligibility_index
+import metrics
+import zone_checker
+
+# Data for the results map. Full resolution tracts and zone layers are far
+# too heavy to send to the browser, so every polygon layer is simplified
+# once per level of detail (zoom level) and the copies are kept with the
+# layer's version. The map draws the level matching its zoom, cropped to the
+# area around the points, and the points themselves go to a GPU scatterplot
+# layer as plain lon/lat arrays.
+#
+# Zoom levels a simplified copy is made for
+LOD_ZOOMS = [4, 6, 8, 10, 12]
+# Simplified copies kept (layer versions x levels)
+MAX_LOD_LAYERS = 64
+# Points drawn at most; above this a random sample is shown
+MAX_MAP_POINTS = 250_000
+# Rough map width in pixels, for picking the initial zoom
+MAP_WIDTH_PX = 1000
+
+NMTC_COLORS = {
+    "Eligible": [255, 215, 0, 140],
+    "Not Eligible": [160, 160, 160, 60],
+    "Severe Distress or Non-Metropolitan": [220, 60, 60, 140],
+    "Deep Distress or High Migration Rural County": [140, 60, 180, 140],
+}
+# Outline only for tracts without eligibility flags
+NO_FLAGS_COLOR = [0, 0, 0, 0]
+# Fill for the USDA and zone layers, in drawing order
+ZONE_COLORS = [[70, 130, 180, 70], [46, 139, 87, 70], [255, 140, 0, 70], [199, 21, 133, 70]]
+POINT_COLORS = {"Yes": [0, 150, 60, 220], "No": [200, 40, 40, 220]}
+UNKNOWN_COLOR = [40, 90, 200, 220]
+
+_levels = OrderedDict()
+_lock = threading.Lock()
+
+
+# Degrees covered by half a screen pixel at zoom
+def pixel_tolerance(zoom):
+    return 360 / (256 * 2 ** zoom) / 2
+
+
+# The prepared level to draw at zoom: the coarsest one still fine enough
+def lod_zoom(zoom):
+    return next((z for z in LOD_ZOOMS if z >= zoom), LOD_ZOOMS[-1])
+
+
+# {zoom: simplified layer} for every level of detail, made the first time a
+# layer version is drawn. Each level is simplified from the next finer one,
+# and polygons smaller than a pixel are dropped.
+def levels(layer):
+    version = zone_checker.layer_version(layer)
+    with _lock:
+        if version in _levels:
+            _levels.move_to_end(version)
+            return _levels[version]
+
+    with metrics.stage("map.simplify", features=len(layer)):
+        gdf = layer.to_crs("EPSG:4326").explode(ignore_index=True)
+        gdf = gdf[gdf.geom_type == "Polygon"]
+        prepared = {}
+        for zoom in sorted(LOD_ZOOMS, reverse=True):
+            tolerance = pixel_tolerance(zoom)
+            gdf = gdf.assign(geometry=gdf.geometry.simplify(tolerance, preserve_topology=True))
+            gdf = gdf[shapely.area(gdf.geometry.values) > tolerance ** 2]
+            gdf.sindex
+            prepared[zoom] = gdf
+    with _lock:
+        _levels[version] = prepared
+        while len(_levels) > MAX_LOD_LAYERS:
+            _levels.popitem(last=False)
+    return prepared
+
+
+# Polygon rows for pydeck's PolygonLayer: "polygon" holds the rings
+# (exterior first) as [lon, lat] lists, rounded to about a metre
+def polygon_records(gdf):
+    geoms = gdf.geometry.values
+    rings, owners = shapely.get_rings(geoms, return_index=True)
+    coords, ring_of = shapely.get_coordinates(rings, return_index=True)
+    ends = np.cumsum(np.bincount(ring_of, minlength=len(rings)))[:-1]
+    ring_lists = [c.tolist() for c in np.split(np.round(coords, 5), ends)]
+    polygons = [[] for _ in range(len(geoms))]
+    for owner, ring in zip(owners, ring_lists):
+        polygons[owner].append(ring)
+    records = pd.DataFrame(gdf.drop(columns=gdf.geometry.name)).reset_index(drop=True)
+    records["polygon"] = polygons
+    return records
+
+
+# The level of layer for zoom, cut down to the features touching bbox
+def layer_view(layer, zoom, bbox=None):
+    gdf = levels(layer)[lod_zoom(zoom)]
+    if bbox is not None:
+        gdf = gdf.iloc[np.sort(gdf.sindex.query(shapely.box(*bbox)))]
+    return gdf
+
+
+# Lon/lat extent of points, padded so some panning stays within the data
+def padded_bounds(points, pad=0.5):
+    minx, maxx = points["longitude"].min(), points["longitude"].max()
+    miny, maxy = points["latitude"].min(), points["latitude"].max()
+    dx = max(maxx - minx, 0.05) * pad
+    dy = max(maxy - miny, 0.05) * pad
+    return (minx - dx, miny - dy, maxx + dx, maxy + dy)
+
+
+# Center and zoom that fit bbox on the map
+def view_for(bbox):
+    minx, miny, maxx, maxy = bbox
+    span = max(maxx - minx, (maxy - miny) / math.cos(math.radians((miny + maxy) / 2)), 1e-4)
+    zoom = math.log2(360 * MAP_WIDTH_PX / 256 / span)
+    return {"latitude": (miny + maxy) / 2, "longitude": (minx + maxx) / 2,
+            "zoom": float(np.clip(math.floor(zoom), 1, 16))}
+
+
+# Matched result rows to draw, colored by USDA eligibility
+def point_records(results, max_points=MAX_MAP_POINTS, seed=0):
+    points = results[results["GEOID"].notna()]
+    if len(points) > max_points:
+        points = points.sample(max_points, random_state=seed)
+    points = points.reset_index(drop=True)
+    points["color"] = [POINT_COLORS.get(value, UNKNOWN_COLOR) for value in points["USDA Eligible"]]
+    return points
+
+
+def _views(layers, zoom, bbox):
+    views = [layer_view(layer, zoom, bbox) for layer in layers]
+    if not views:
+        return gpd.GeoDataFrame({"GEOID": []}, geometry=[], crs="EPSG:4326")
+    return pd.concat(views, ignore_index=True)
+
+
+# One state's tracts, kept per tract source so its levels are built once
+# and shared by every state selection that includes it
+_state_tract_layers = {}
+
+
+def _state_tracts(checker, fip):
+    key = (checker.tracts_version, fip)
+    with _lock:
+        tracts = _state_tract_layers.get(key)
+    if tracts is None:
+        tracts = checker.tracts_for([fip])[["GEOID", "geometry"]].reset_index(drop=True)
+        tracts.attrs["version"] = f"{checker.tracts_version}/{fip}"
+        with _lock:
+            _state_tract_layers[key] = tracts
+    return tracts
+
+
+# Polygon layers to draw for checker's states around points at zoom:
+# (name, records) pairs, tracts colored by NMTC eligibility and one entry
+# per loaded zone layer
+def polygon_layers(checker, points, zoom):
+    bbox = padded_bounds(points)
+    codes = np.unique(eligibility_index.state_codes(eligibility_index.geoid_ints(points["GEOID"])))
+    fips = [f"{code:02d}" for code in codes if code >= 0]
+    fips = [fip for fip in checker.selected_states() if fip in fips]
+
+    layers = []
+    with metrics.stage("map.layers", zoom=zoom, level=lod_zoom(zoom)) as record:
+        tracts = _views([_state_tracts(checker, fip) for fip in fips], zoom, bbox)
+        flags = checker.eligibility.lookup(eligibility_index.geoid_ints(tracts["GEOID"]))
+        tracts["NMTC Eligibility"] = flags["NMTC Eligibility"].to_numpy()
+        tracts["color"] = [NMTC_COLORS.get(value, NO_FLAGS_COLOR) for value in tracts["NMTC Eligibility"]]
+        layers.append(("Census tracts", polygon_records(tracts[["GEOID", "NMTC Eligibility", "color", "geometry"]])))
+
+        usda = checker.usda_layers(fips)
+        if usda:
+            layers.append(("USDA ineligible areas", polygon_records(_views(usda, zoom, bbox)[["geometry"]])))
+        for _, col_name, _ in checker.zone_columns(fips):
+            layer = checker.zone_layers.get(col_name)
+            if layer is not None:
+                layers.append((col_name, polygon_records(layer_view(layer, zoom, bbox)[["geometry"]])))
+        record["polygons"] = sum(len(records) for _, records in layers)
+    return layers
@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Pipeline instrumentation. Code wraps a step in stage() (duration plus any
+# fields the step adds: bytes, features, cache result, attempts) and calls
+# count() for things like cache hits, retries and bytes downloaded. Every
+# stage/count becomes one JSON event on this module's logger, and totals are
+# kept in memory for snapshot() (/metrics in service.py, the app's
+# diagnostics panel). Set ZONE_METRICS_LOG to also append the events to a
+# JSON lines file.
+METRICS_LOG = os.environ.get("ZONE_METRICS_LOG")
+# Events kept in memory for recent()
+RECENT_EVENTS = 2000
+
+_lock = threading.Lock()
+_counters = {}
+_stages = {}
+_recent = deque(maxlen=RECENT_EVENTS)
+_captures = []
+
+if METRICS_LOG:
+    _handler = logging.FileHandler(METRICS_LOG)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+
+def _emit(event):
+    event["at"] = round(time.time(), 3)
+    event["thread"] = threading.current_thread().name
+    with _lock:
+        _recent.append(event)
+        for events in _captures:
+            events.append(event)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(event, default=str))
+
+
+# Add value to counter name (labels split it, e.g. result="hit")
+def count(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _emit({"type": "count", "name": name, "value": value, **labels})
+
+
+# Time the block as stage name. The yielded dict is logged with the event,
+# so the block can add fields to it (record["features"] = len(gdf)).
+@contextmanager
+def stage(name, **fields):
+    record = dict(fields)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        with _lock:
+            stats = _stages.setdefault(name, {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stats["count"] += 1
+            stats["errors"] += "error" in record
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        _emit({"type": "stage", "name": name, "seconds": round(seconds, 6), **record})
+
+
+# Collect every event emitted (on any thread) while the block runs
+@contextmanager
+def capture():
+    events = []
+    with _lock:
+        _captures.append(events)
+    try:
+        yield events
+    finally:
+        with _lock:
+            _captures.remove(events)
+
+
+def recent():
+    with _lock:
+        return list(_recent)
+
+
+# Totals since start (or reset()) as plain JSON-able data
+def snapshot():
+    with _lock:
+        counters = [{"name": name, **dict(labels), "value": value} for (name, labels), value in _counters.items()]
+        stages = {name: {**stats,
+                         "total_seconds": round(stats["total_seconds"], 6),
+                         "mean_seconds": round(stats["total_seconds"] / stats["count"], 6),
+                         "max_seconds": round(stats["max_seconds"], 6)}
+                  for name, stats in _stages.items()}
+    return {"counters": counters, "stages": stages}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _stages.clear()
+        _recent.clear()
@@ -0,0 +1,126 @@
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import eligibility_index
+import result_export
+import result_memo
+import snapshot
+import streaming
+import zone_checker
+
+# Multi-core batch checks. Points are split into spatial partitions (grid
+# cells), each partition is checked in a worker process that builds its own
+# ZoneChecker once, and the results are put back in input order. Workers
+# read their layers from the on-disk caches (GeoParquet layer cache, HF
+# tract files, memory-mapped national index), which the parent warms first
+# so the workers never download anything themselves.
+PARTITION_CELL_DEGREES = 1.0
+# Partitions per worker; more than one evens out dense and sparse cells
+PARTITIONS_PER_WORKER = 4
+
+_worker_checker = None
+
+
+def _init_worker(fips_codes, tract_zones_dir):
+    global _worker_checker
+    # Results already in the shared store (from this run or an earlier one) are not checked again
+    memo = result_memo.ResultMemo(store=result_memo.default_store())
+    if snapshot.current() is not None:
+        _worker_checker = snapshot.current().checker(fips_codes, memo=memo)
+    else:
+        _worker_checker = zone_checker.ZoneChecker(fips_codes, memo=memo).load()
+    if tract_zones_dir:
+        _worker_checker.load_precomputed(tract_zones_dir)
+
+
+def _check_partition(part):
+    results, warnings = _worker_checker.check(part)
+    return part.index.to_numpy(), results, warnings
+
+
+# Split df into about n_parts groups of whole grid cells, balanced by row count
+def partition(df, n_parts, cell_degrees=PARTITION_CELL_DEGREES):
+    cells = (np.floor(df["latitude"].to_numpy() / cell_degrees).astype(np.int64) * 100_000
+             + np.floor(df["longitude"].to_numpy() / cell_degrees).astype(np.int64))
+    keys, inverse, counts = np.unique(cells, return_inverse=True, return_counts=True)
+
+    # Largest cells first, each into the currently smallest partition
+    loads = np.zeros(n_parts, dtype=np.int64)
+    assignment = np.empty(len(keys), dtype=np.int64)
+    for cell in np.argsort(-counts, kind="stable"):
+        target = int(np.argmin(loads))
+        assignment[cell] = target
+        loads[target] += counts[cell]
+
+    part_of_row = assignment[inverse]
+    return [df[part_of_row == i] for i in range(n_parts) if loads[i]]
+
+
+def _warm(fips_codes, df):
+    if snapshot.current() is not None:
+        # Nothing to download; workers read the same snapshot
+        return snapshot.current().checker(fips_codes)
+    checker = zone_checker.ZoneChecker(fips_codes)
+    if fips_codes is None:
+        geoids = checker.tract_index.lookup(df["longitude"].to_numpy(), df["latitude"].to_numpy())
+        codes = set(np.unique(eligibility_index.state_codes(geoids)).tolist())
+        checker.load([fip for fip in checker.selected_states() if int(fip) in codes])
+    else:
+        checker.load()
+    return checker
+
+
+# Check df (latitude/longitude columns) on `workers` processes. fips_codes
+# None uses the national tract index. Returns (results, warnings) like
+# ZoneChecker.check, in the original row order.
+def check_parallel(df, fips_codes=None, workers=None, tract_zones_dir=None):
+    workers = workers or os.cpu_count() or 1
+    df = df.reset_index(drop=True)
+    checker = _warm(fips_codes, df)
+    if df.empty:
+        # No partitions to hand out; the checker gives the empty result columns
+        return checker.check(df)
+
+    parts = partition(df, workers * PARTITIONS_PER_WORKER)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(fips_codes, tract_zones_dir)) as pool:
+        outputs = list(pool.map(_check_partition, parts))
+
+    positions = np.concatenate([pos for pos, _, _ in outputs])
+    results = pd.concat([res for _, res, _ in outputs], ignore_index=True)
+    results = results.iloc[np.argsort(positions, kind="stable")].reset_index(drop=True)
+    warnings = streaming.merge_warnings(checker, [w for _, _, part_warnings in outputs for w in part_warnings])
+    return results, warnings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a coordinates CSV on several cores.")
+    parser.add_argument("input", help="CSV with latitude and longitude columns")
+    parser.add_argument("output", help="where to write the results (.csv, .parquet, .arrow or .xlsx)")
+    parser.add_argument("--states", nargs="*", help="state FIPS codes (default: national tract index)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--tract-zones", default=None, help="directory of precomputed tract/zone indexes")
+    args = parser.parse_args()
+    try:
+        result_export.format_of(args.output)
+    except ValueError as e:
+        parser.error(str(e))
+
+    df, rejects = streaming.read_coordinates(args.input)
+    if not rejects.empty:
+        print(streaming.rejected_warning(rejects["reason"].value_counts().to_dict(), rejects).message)
+    results, warnings = check_parallel(df, args.states or None, args.workers, args.tract_zones)
+    for warning in warnings:
+        print(warning.message)
+    result_export.write_results(results, args.output)
+    print(f"Wrote {len(results)} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import os
+
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Result files, written a chunk at a time so a large batch never has to be
+# held in memory (or turned into one big CSV string) to be saved. Parquet
+# and Arrow IPC keep the column types: Yes/No flags, NMTC eligibility and
+# the state are dictionary encoded, coordinates are doubles. CSV is written
+# by pandas one chunk at a time, in the same format as before, and XLSX
+# row by row.
+#
+# Format -> file extension
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow", "xlsx": ".xlsx"}
+MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+# Data rows that fit on one worksheet (below the header)
+EXCEL_MAX_ROWS = 1_048_575
+# Rows converted at a time by export()
+BATCH_ROWS = 50_000
+
+
+def format_of(path):
+    suffix = os.path.splitext(str(path))[1].lower()
+    for fmt, extension in FORMATS.items():
+        if suffix == extension:
+            return fmt
+    raise ValueError(f"Unknown results format '{suffix}'; use one of {', '.join(FORMATS.values())}.")
+
+
+# Arrow schema for a results frame. Columns that are empty in this chunk
+# (e.g. GEOID when no point matched) would come out as the null type and
+# clash with later chunks, so they are written as strings.
+def _schema(df):
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    return schema
+
+
+class ResultWriter:
+    # Appends result chunks (DataFrames) to path in fmt, by default the one
+    # its extension names. The first chunk fixes the columns and types.
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.fmt = fmt or format_of(path)
+        self.rows = 0
+        self._schema = None
+        self._writer = None
+
+    def write(self, df):
+        if self._schema is None:
+            self._schema = _schema(df)
+            self._open()
+        if self.fmt == "csv":
+            self._write_csv(df)
+        else:
+            self.write_table(pa.Table.from_pandas(df, schema=self._schema, preserve_index=False))
+
+    def write_table(self, table):
+        if self._writer is None:
+            self._schema = table.schema
+            self._open()
+        if self.fmt == "csv":
+            self._write_csv(table.to_pandas())
+            return
+        if self.fmt == "xlsx":
+            if self.rows + len(table) > EXCEL_MAX_ROWS:
+                raise ValueError(f"Excel files hold at most {EXCEL_MAX_ROWS:,} rows; use CSV or Parquet instead.")
+            for row in zip(*(column.to_pylist() for column in table.columns)):
+                self._writer.append(row)
+        else:
+            self._writer.write_table(table)
+        self.rows += len(table)
+
+    def _write_csv(self, df):
+        # A chunk with other columns would shift every value under the header
+        if list(df.columns) != self._schema.names:
+            raise ValueError(f"Result columns changed between chunks: {list(df.columns)} != {self._schema.names}")
+        df.to_csv(self._writer, index=False, header=False)
+        self.rows += len(df)
+
+    def _open(self):
+        if self.fmt == "parquet":
+            self._writer = pq.ParquetWriter(self.path, self._schema)
+        elif self.fmt == "arrow":
+            self._writer = pa.ipc.new_file(self.path, self._schema)
+        elif self.fmt == "csv":
+            self._writer = open(self.path, "w", newline="")
+            if self._schema.names:
+                pd.DataFrame(columns=self._schema.names).to_csv(self._writer, index=False)
+        else:
+            # Write-only workbooks stream their rows to disk
+            self._workbook = openpyxl.Workbook(write_only=True)
+            self._writer = self._workbook.create_sheet("Results")
+            self._writer.append(self._schema.names)
+
+    def close(self):
+        if self._writer is None:
+            # Nothing was written; leave an empty file rather than none
+            self._schema = pa.schema([])
+            self._open()
+        if self.fmt == "xlsx":
+            self._workbook.save(self.path)
+        else:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# Whole results frame to path, in chunks
+def write_results(results, path, fmt=None, chunk_rows=BATCH_ROWS):
+    with ResultWriter(path, fmt) as writer:
+        for start in range(0, max(len(results), 1), chunk_rows):
+            writer.write(results.iloc[start:start + chunk_rows])
+    return writer.rows
+
+
+# Copy the Parquet results file at source to path in fmt, a batch at a time
+def export(source, path, fmt=None):
+    parquet = pq.ParquetFile(source, memory_map=True)
+    with ResultWriter(path, fmt) as writer:
+        for batch in parquet.iter_batches(batch_size=BATCH_ROWS):
+            writer.write_table(pa.Table.from_batches([batch], schema=parquet.schema_arrow))
+    return writer.rows
+
+
+# Columns of a results file written by ResultWriter
+def read_results(path, columns=None):
+    fmt = format_of(path)
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+    if fmt == "arrow":
+        with pa.memory_map(str(path)) as source:
+            table = pa.ipc.open_file(source).read_all()
+        return (table.select(columns) if columns else table).to_pandas()
+    if fmt == "csv":
+        return pd.read_csv(path, usecols=columns, dtype={"GEOID": str})
+    return pd.read_excel(path, usecols=columns, dtype={"GEOID": str})
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Results already worked out for a point, so a rerun only joins the points
+# and layers it hasn't seen: adding a state computes just the new state's
+# columns, and re-uploading a file with a few edited rows joins just those
+# rows. Points are keyed by a 64-bit hash of their coordinates, snapped to
+# SNAP_DECIMALS. Each column is stored under the version of the layer it
+# came from, so a refreshed layer starts from scratch (and the old version
+# is dropped).
+#
+# With a ResultStore the results also go to SQLite, so sites seen in an
+# earlier run (the nightly batch repeats most of them) are skipped until
+# one of their layers is refreshed.
+#
+# Points kept per column; past this the oldest half is dropped
+MAX_POINTS = 1_000_000
+# Coordinates are rounded to this many decimals (6 is about 0.1 m) before
+# they are checked, so repeats of a site written slightly differently are
+# checked once
+SNAP_DECIMALS = int(os.environ.get("ZONE_SNAP_DECIMALS", 6))
+# Persistent results; set to an empty string to keep results in memory only
+RESULT_DB = os.environ.get("ZONE_RESULT_DB", str(Path.home() / ".cache" / "zone-check" / "results.sqlite"))
+
+
+def snap(latitude, longitude):
+    return (np.round(np.asarray(latitude, dtype=float), SNAP_DECIMALS),
+            np.round(np.asarray(longitude, dtype=float), SNAP_DECIMALS))
+
+
+def point_keys(latitude, longitude):
+    frame = pd.DataFrame({"latitude": np.asarray(latitude, dtype=float),
+                          "longitude": np.asarray(longitude, dtype=float)})
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+class ResultMemo:
+    # Shared between checkers (the app keeps one per process), so every
+    # method is safe to call from several threads. A stored column is never
+    # modified, only replaced.
+
+    def __init__(self, max_points=MAX_POINTS, store=None):
+        self.max_points = max_points
+        self.store = store
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    # (values, found) for keys under column; values is a fresh array of dtype
+    # and only meaningful where found is True
+    def get(self, column, keys, dtype):
+        with self._lock:
+            stored = self._columns.get(column)
+        if stored is None:
+            values, found = np.zeros(len(keys), dtype=dtype), np.zeros(len(keys), dtype=bool)
+        else:
+            positions = stored.index.get_indexer(keys)
+            found = positions >= 0
+            values = stored.to_numpy()[np.where(found, positions, 0)].astype(dtype)
+
+        if self.store is not None and persistent(column) and not found.all():
+            missing = np.flatnonzero(~found)
+            hit, hit_values = self.store.get(column, keys[missing])
+            if hit.any():
+                values[missing[hit]] = hit_values[hit].astype(dtype)
+                found[missing[hit]] = True
+                self._remember(column, keys[missing[hit]], values[missing[hit]])
+        return values, found
+
+    # column is a (name, version) pair
+    def put(self, column, keys, values):
+        if not len(keys):
+            return
+        self._remember(column, keys, values)
+        if self.store is not None and persistent(column):
+            self.store.put(column, keys, values)
+
+    def _remember(self, column, keys, values):
+        new = pd.Series(values, index=pd.Index(keys))
+        new = new[~new.index.duplicated()]
+        with self._lock:
+            for old in [c for c in self._columns if c[0] == column[0] and c != column]:
+                del self._columns[old]
+            stored = self._columns.get(column)
+            if stored is not None:
+                new = pd.concat([stored, new[~new.index.isin(stored.index)]])
+            if len(new) > self.max_points:
+                new = new.iloc[-(self.max_points // 2):]
+            self._columns[column] = new
+
+    # Points and bytes held, for the diagnostics panel
+    def stats(self):
+        with self._lock:
+            columns = list(self._columns.values())
+        return {"columns": len(columns),
+                "points": sum(len(c) for c in columns),
+                "bytes": sum(int(c.memory_usage(index=True)) for c in columns)}
+
+    def clear(self):
+        with self._lock:
+            self._columns.clear()
+
+
+# Only versions that mean the same thing in the next process are persisted
+# (see zone_checker.layer_version)
+def persistent(column):
+    return not str(column[1]).startswith("local-")
+
+
+class ResultStore:
+    # SQLite table of (column name, layer version, point key) -> integer
+    # result. Several processes (parallel.py's workers) can share one file.
+
+    def __init__(self, path=RESULT_DB):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._con = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.execute("CREATE TABLE IF NOT EXISTS results (name TEXT, version TEXT, key INTEGER, value INTEGER, "
+                          "PRIMARY KEY (name, version, key)) WITHOUT ROWID")
+        self._con.execute("CREATE TEMP TABLE lookup (key INTEGER PRIMARY KEY)")
+        self._lock = threading.Lock()
+        # Columns whose older versions were already dropped by this process
+        self._current = set()
+
+    # (hit, values) for keys under column
+    def get(self, column, keys):
+        name, version = column[0], str(column[1])
+        signed = np.asarray(keys, dtype=np.uint64).view(np.int64)
+        # The transaction ends with the lookup, so the next one sees other processes' writes
+        with self._lock, self._con:
+            self._con.execute("DELETE FROM lookup")
+            self._con.executemany("INSERT OR IGNORE INTO lookup VALUES (?)", ((int(k),) for k in signed))
+            rows = self._con.execute("SELECT r.key, r.value FROM results r JOIN lookup USING (key) "
+                                     "WHERE r.name = ? AND r.version = ?", (name, version)).fetchall()
+        if not rows:
+            return np.zeros(len(keys), dtype=bool), np.zeros(len(keys), dtype=np.int64)
+        found = pd.Series(np.array([value for _, value in rows], dtype=np.int64),
+                          index=np.array([key for key, _ in rows], dtype=np.int64))
+        positions = found.index.get_indexer(signed)
+        hit = positions >= 0
+        return hit, found.to_numpy()[np.where(hit, positions, 0)]
+
+    def put(self, column, keys, values):
+        name, version = column[0], str(column[1])
+        signed = np.asarray(keys, dtype=np.uint64).view(np.int64)
+        rows = [(name, version, key, value)
+                for key, value in zip(signed.tolist(), np.asarray(values, dtype=np.int64).tolist())]
+        with self._lock, self._con:
+            if column not in self._current:
+                # A refreshed layer makes the old version's results useless
+                self._con.execute("DELETE FROM results WHERE name = ? AND version <> ?", (name, version))
+                self._current.add(column)
+            self._con.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", rows)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._con.execute("SELECT name, COUNT(*) FROM results GROUP BY name").fetchall())
+
+
+# The shared store at RESULT_DB, or None if persistence is turned off
+def default_store():
+    return ResultStore(RESULT_DB) if RESULT_DB else None
@@ -0,0 +1,170 @@
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+import requests
+
+import metrics
+
+# Retry policy for everything that goes over the network. Only transient
+# errors (timeouts, dropped connections, 429/5xx) are retried, with
+# exponential backoff and full jitter, and a per-host circuit breaker stops
+# hammering a host that keeps failing. Attempts, waits and breaker trips
+# are reported through metrics.
+CONNECT_TIMEOUT = float(os.environ.get("ZONE_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("ZONE_READ_TIMEOUT", 60))
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# HTTP (or ArcGIS error body) codes worth retrying; any other 4xx means the
+# request itself is wrong and will fail the same way again
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    # A ConnectionError so layer_cache serves its stale copy, if it has one
+    pass
+
+
+def status_of(e):
+    # ArcGIS errors come back as 200 with the real code in the body
+    code = getattr(e, "code", None)
+    if code is not None:
+        return code
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(e):
+    if getattr(e, "retries_exhausted", False) or isinstance(e, CircuitOpenError):
+        return False
+    if isinstance(e, requests.HTTPError):
+        return status_of(e) in RETRYABLE_STATUS
+    if isinstance(e, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        return True
+    # Wrappers like huggingface_hub's LocalEntryNotFoundError keep the network error as the cause
+    return e.__cause__ is not None and is_retryable(e.__cause__)
+
+
+def _retry_after(e):
+    response = getattr(e, "response", None)
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    # Per host: after failure_threshold transient failures in a row the host
+    # is failed fast for reset_seconds, then a single trial request is let
+    # through. Success closes the circuit, another failure opens it again.
+
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host):
+        return self._hosts.setdefault(host, {"failures": 0, "opened_at": None, "trial": False})
+
+    def before(self, host):
+        with self._lock:
+            state = self._state(host)
+            if state["opened_at"] is None:
+                return
+            remaining = state["opened_at"] + self.reset_seconds - time.monotonic()
+            if remaining > 0 or state["trial"]:
+                metrics.count("circuit_rejected", host=host)
+                raise CircuitOpenError(f"{host} is failing; skipping it for another {max(remaining, 0):.0f}s")
+            state["trial"] = True
+
+    def success(self, host):
+        with self._lock:
+            self._hosts[host] = {"failures": 0, "opened_at": None, "trial": False}
+
+    def failure(self, host):
+        with self._lock:
+            state = self._state(host)
+            state["failures"] += 1
+            if state["trial"] or (state["opened_at"] is None and state["failures"] >= self.failure_threshold):
+                state["opened_at"] = time.monotonic()
+                state["trial"] = False
+                metrics.count("circuit_opened", host=host)
+
+    def states(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                host: {
+                    "state": ("closed" if state["opened_at"] is None
+                              else "open" if now - state["opened_at"] < self.reset_seconds else "half_open"),
+                    "failures": state["failures"],
+                }
+                for host, state in self._hosts.items()
+            }
+
+
+breakers = CircuitBreaker()
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 15.0
+    # No new attempt once this many seconds have passed; this bounds the
+    # worst case for one call together with the timeouts
+    max_elapsed: float = 90.0
+
+    # Full jitter: anywhere between 0 and the exponential delay
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    # Call func() until it succeeds, fails with a permanent error or the
+    # attempts/time run out. With host, the host's circuit breaker is
+    # consulted and updated. record (a metrics.stage dict) gets the attempt
+    # count and the total wait.
+    def run(self, func, host=None, name=None, record=None, breaker=breakers):
+        breaker = breaker if host is not None else None
+        target = {"host": host} if host is not None else {"call": name}
+        start = time.monotonic()
+        waited = 0.0
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                metrics.count("attempts", **target)
+                if breaker is not None:
+                    breaker.before(host)
+                try:
+                    result = func()
+                except Exception as e:
+                    retryable = is_retryable(e)
+                    if breaker is not None:
+                        # A permanent error still means the host answered
+                        (breaker.failure if retryable else breaker.success)(host)
+                    if not retryable:
+                        raise
+                    wait = max(self.backoff(attempt - 1), _retry_after(e) or 0)
+                    if attempt >= self.max_attempts or time.monotonic() - start + wait > self.max_elapsed:
+                        metrics.count("retries_exhausted", **target)
+                        # Callers further up shouldn't retry this again
+                        e.retries_exhausted = True
+                        raise
+                    metrics.count("retries", **target)
+                    metrics.count("retry_wait_seconds", round(wait, 3), **target)
+                    waited += wait
+                    time.sleep(wait)
+                else:
+                    if breaker is not None:
+                        breaker.success(host)
+                    return result
+        finally:
+            if record is not None:
+                record["attempts"] = attempt
+                record["retry_wait_seconds"] = round(waited, 3)
+
+
+HTTP_POLICY = RetryPolicy()
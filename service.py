@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from aiohttp import web
+
+import metrics
+import result_memo
+import retries
+import snapshot
+import zone_checker
+
+# HTTP lookup service on top of ZoneChecker. Layers are loaded once at
+# startup and stay in memory. Concurrent requests are queued for a few
+# milliseconds and run as one vectorized check, so a burst of single-point
+# calls costs about the same as one batch.
+BATCH_WINDOW_SECONDS = 0.005
+MAX_BATCH_POINTS = 10_000
+MAX_REQUEST_POINTS = 100_000
+# Latency samples kept per endpoint for the percentiles in /metrics
+LATENCY_SAMPLES = 10_000
+
+
+def _records(results):
+    # NaN -> null for JSON
+    return results.astype(object).where(results.notna(), None).to_dict("records")
+
+
+class MicroBatcher:
+
+    def __init__(self, checker, window=BATCH_WINDOW_SECONDS, max_points=MAX_BATCH_POINTS):
+        self.checker = checker
+        self.window = window
+        self.max_points = max_points
+        self.queue = asyncio.Queue()
+        # One check at a time; the next batch collects while this one runs
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batch_sizes = deque(maxlen=LATENCY_SAMPLES)
+
+    # Check df as part of the next batch; returns this request's result rows
+    async def submit(self, df):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((df, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.window
+            while size < self.max_points:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            self.batch_sizes.append(size)
+            combined = pd.concat([df for df, _ in batch], ignore_index=True)
+            try:
+                results, _ = await loop.run_in_executor(self.executor, self.checker.check, combined)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            start = 0
+            for df, future in batch:
+                if not future.done():
+                    future.set_result(results.iloc[start:start + len(df)].reset_index(drop=True))
+                start += len(df)
+
+
+class LatencyStats:
+
+    def __init__(self):
+        self.samples = {}
+        self.counts = {}
+
+    def record(self, endpoint, seconds):
+        self.samples.setdefault(endpoint, deque(maxlen=LATENCY_SAMPLES)).append(seconds * 1000)
+        self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def summary(self):
+        summary = {}
+        for endpoint, samples in self.samples.items():
+            values = np.fromiter(samples, dtype=float)
+            summary[endpoint] = {
+                "requests": self.counts[endpoint],
+                "p50_ms": round(float(np.percentile(values, 50)), 3),
+                "p99_ms": round(float(np.percentile(values, 99)), 3),
+                "max_ms": round(float(values.max()), 3),
+            }
+        return summary
+
+
+def _points_frame(points):
+    try:
+        df = pd.DataFrame(points, columns=["latitude", "longitude"])
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(reason="points must be {latitude, longitude} objects")
+    df = df.apply(pd.to_numeric, errors="coerce")
+    if df.isna().any().any():
+        raise web.HTTPBadRequest(reason="latitude and longitude must be numbers")
+    return df
+
+
+def _warnings(checker, results):
+    messages = [w.message for w in checker.load_warnings]
+    unmatched = results[results["GEOID"].isna()]
+    if not unmatched.empty:
+        messages.append(checker.unmatched_warning(unmatched).message)
+    return messages
+
+
+@web.middleware
+async def timing_middleware(request, handler):
+    start = time.perf_counter()
+    try:
+        return await handler(request)
+    finally:
+        request.app["latency"].record(request.path, time.perf_counter() - start)
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(reason="request body must be JSON")
+
+
+async def check_point(request):
+    if request.method == "POST":
+        body = await _json_body(request)
+    else:
+        body = request.query
+    try:
+        point = {"latitude": body["latitude"], "longitude": body["longitude"]}
+    except (KeyError, TypeError):
+        raise web.HTTPBadRequest(reason="latitude and longitude are required")
+
+    results = await request.app["batcher"].submit(_points_frame([point]))
+    return web.json_response({"result": _records(results)[0],
+                              "warnings": _warnings(request.app["checker"], results)})
+
+
+async def check_batch(request):
+    body = await _json_body(request)
+    points = body.get("points") if isinstance(body, dict) else None
+    if not isinstance(points, list) or not points:
+        raise web.HTTPBadRequest(reason="'points' must be a non-empty list of {latitude, longitude}")
+    if len(points) > MAX_REQUEST_POINTS:
+        raise web.HTTPRequestEntityTooLarge(max_size=MAX_REQUEST_POINTS, actual_size=len(points))
+
+    results = await request.app["batcher"].submit(_points_frame(points))
+    return web.json_response({"results": _records(results),
+                              "warnings": _warnings(request.app["checker"], results)})
+
+
+async def metrics_handler(request):
+    sizes = np.fromiter(request.app["batcher"].batch_sizes, dtype=float)
+    return web.json_response({
+        "latency": request.app["latency"].summary(),
+        "batches": len(sizes),
+        "mean_batch_points": round(float(sizes.mean()), 2) if len(sizes) else 0,
+        # Loader/check stage timings, cache hits, retries and bytes downloaded
+        "pipeline": metrics.snapshot(),
+        "circuits": retries.breakers.states(),
+    })
+
+
+async def health(request):
+    return web.json_response({"status": "ok"})
+
+
+def create_app(checker, window=BATCH_WINDOW_SECONDS):
+    app = web.Application(middlewares=[timing_middleware])
+    app["checker"] = checker
+    app["latency"] = LatencyStats()
+
+    async def start_batcher(app):
+        app["batcher"] = MicroBatcher(checker, window=window)
+        app["batcher_task"] = asyncio.create_task(app["batcher"].run())
+        yield
+        app["batcher_task"].cancel()
+        app["batcher"].executor.shutdown(wait=False)
+
+    app.cleanup_ctx.append(start_batcher)
+    app.router.add_get("/check", check_point)
+    app.router.add_post("/check", check_point)
+    app.router.add_post("/check/batch", check_batch)
+    app.router.add_get("/metrics", metrics_handler)
+    app.router.add_get("/health", health)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zone eligibility lookup service.")
+    parser.add_argument("--states", nargs="*", help="state FIPS codes (default: national tract index)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--window-ms", type=float, default=BATCH_WINDOW_SECONDS * 1000,
+                        help="how long to collect requests into one batch")
+    parser.add_argument("--tract-zones", default=None, help="directory of precomputed tract/zone indexes")
+    args = parser.parse_args()
+
+    # Load every layer up front so no request waits on a download
+    memo = result_memo.ResultMemo(store=result_memo.default_store())
+    if snapshot.current() is not None:
+        checker = snapshot.current().checker(args.states or None, memo=memo)
+    else:
+        checker = zone_checker.ZoneChecker(args.states or None, memo=memo)
+        checker.load(checker.selected_states())
+    if args.tract_zones:
+        checker.load_precomputed(args.tract_zones)
+    web.run_app(create_app(checker, window=args.window_ms / 1000), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
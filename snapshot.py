@@ -0,0 +1,362 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import shapely
+
+import eligibility_index
+import metrics
+import tract_index
+import tract_zones
+import zone_checker
+
+# Versioned layer snapshots for offline warm starts. `build` downloads every
+# layer the app uses (tracts, USDA, every state zone layer, eligibility
+# flags), runs the preprocessing (canonical CRS, national tract index,
+# tract/zone precompute) and writes it all into one directory with a
+# manifest of SHA-256 checksums. With ZONE_SNAPSHOT pointing at the
+# snapshot root (or one version in it), the app, service.py and parallel.py
+# build their ZoneChecker from it: memory-mapped reads, no network.
+#
+#   python snapshot.py build                 # new version, made current
+#   python snapshot.py list
+#   python snapshot.py verify
+#   python snapshot.py diff OLD NEW          # what changed between versions
+#   python snapshot.py use VERSION           # pin (or roll back to) a version
+SNAPSHOT_ROOT = Path(os.environ.get("ZONE_SNAPSHOT_ROOT", Path.home() / ".cache" / "zone-check" / "snapshots"))
+# Root (containing CURRENT) or a single version directory to load from; unset = live loading
+SNAPSHOT = os.environ.get("ZONE_SNAPSHOT")
+
+# Bump when the bundle layout changes
+SNAPSHOT_FORMAT = 1
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+USDA_LAYER = "USDA Eligible"
+
+
+class SnapshotError(RuntimeError):
+    pass
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 ** 2), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json(path, data):
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _content_version(checksums):
+    return "snapshot:" + hashlib.sha256("".join(checksums).encode()).hexdigest()[:16]
+
+
+class Snapshot:
+    # One version directory and its manifest
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        try:
+            with open(self.directory / MANIFEST) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"No readable snapshot in {self.directory}: {e}")
+        if self.manifest.get("format") != SNAPSHOT_FORMAT:
+            raise SnapshotError(f"{self.directory} has snapshot format {self.manifest.get('format')}, "
+                                f"expected {SNAPSHOT_FORMAT}")
+        self.version = self.manifest["version"]
+        self._tract_index = None
+
+    def _path(self, relpath):
+        return self.directory / relpath
+
+    def _checksum(self, relpath):
+        return self.manifest["files"][relpath]["sha256"]
+
+    def _layer_version(self, name):
+        layer = self.manifest["layers"][name]
+        return _content_version([self._checksum(layer["file"])])
+
+    # Files whose checksum (or, with full=False, size) doesn't match the manifest
+    def verify(self, full=True):
+        bad = []
+        for relpath, entry in self.manifest["files"].items():
+            path = self._path(relpath)
+            if not path.exists() or path.stat().st_size != entry["bytes"]:
+                bad.append(relpath)
+            elif full and file_sha256(path) != entry["sha256"]:
+                bad.append(relpath)
+        return bad
+
+    def _read_layer(self, name):
+        gdf = gpd.read_parquet(self._path(self.manifest["layers"][name]["file"]), memory_map=True)
+        gdf.attrs["version"] = self._layer_version(name)
+        gdf.sindex
+        return gdf
+
+    def tract_index(self):
+        if self._tract_index is None:
+            self._tract_index = tract_index.NationalTractIndex.read(self._path(self.manifest["tract_index"]))
+            prefix = self.manifest["tract_index"] + "/"
+            self._tract_index.version = _content_version(
+                [entry["sha256"] for relpath, entry in sorted(self.manifest["files"].items()) if relpath.startswith(prefix)])
+        return self._tract_index
+
+    def tracts(self, fips_codes):
+        files = [self.manifest["tracts"][fip] for fip in fips_codes if fip in self.manifest["tracts"]]
+        if not files:
+            return None
+        gdf = pd.concat([gpd.read_parquet(self._path(relpath), memory_map=True) for relpath in files],
+                        ignore_index=True)
+        gdf.attrs["version"] = _content_version([self._checksum(relpath) for relpath in files])
+        return gdf
+
+    # A loaded ZoneChecker for fips_codes (None = national mode) that never
+    # touches the network. Layers that failed when the snapshot was built
+    # come back as load warnings, like a failed download would.
+    def checker(self, fips_codes=None, memo=None):
+        with metrics.stage("snapshot.load", version=self.version,
+                           states=len(fips_codes) if fips_codes is not None else "all"):
+            if fips_codes is None:
+                tracts, index = None, self.tract_index()
+            else:
+                tracts, index = self.tracts(fips_codes), None
+                if tracts is None:
+                    raise SnapshotError(f"Snapshot {self.version} has no tracts for states {fips_codes}")
+
+            layers = self.manifest["layers"]
+            usda = self._read_layer(USDA_LAYER) if USDA_LAYER in layers else None
+            states = fips_codes if fips_codes is not None else list(zone_checker.STATE_FIPS.values())
+            zone_layers = {col_name: self._read_layer(col_name) if col_name in layers else None
+                           for fip in states for col_name, _ in zone_checker.STATE_ZONE_LOADERS.get(fip, [])}
+            indexes = tract_zones.load_indexes([USDA_LAYER] + list(zone_layers), self._path("tract_zones"))
+            for name, zone_index in indexes.items():
+                if name in layers:
+                    zone_index.version = self._layer_version(name)
+
+            checker = zone_checker.ZoneChecker(
+                fips_codes, tracts_gdf=tracts, usda_gdf=usda,
+                eligibility=eligibility_index.EligibilityIndex.read(self._path(self.manifest["eligibility"])),
+                zone_layers=zone_layers, tract_zones=indexes, tract_index=index, memo=memo,
+                usda_states=self.manifest.get("usda_states"))
+            failed = self.manifest.get("failed", {})
+            covered = self.manifest.get("usda_states")
+            for fip in checker.selected_states() if covered is not None else []:
+                if fip in covered or fip not in self.manifest["tracts"]:
+                    continue
+                name = f"USDA ineligible areas ({zone_checker.FIPS_STATES.get(fip, fip)})"
+                checker.load_warnings.append(zone_checker.CheckWarning(
+                    "layer_failed", f"{name} is missing from snapshot {self.version}: "
+                                    f"{failed.get(name, 'not in the snapshot')}", name))
+            for col_name, layer in zone_layers.items():
+                if layer is None:
+                    reason = failed.get(col_name, "not in the snapshot")
+                    checker.load_warnings.append(zone_checker.CheckWarning(
+                        "layer_failed", f"{col_name} is missing from snapshot {self.version}: {reason}", col_name))
+            if fips_codes is not None:
+                missing = [fip for fip in fips_codes if fip not in self.manifest["tracts"]]
+                if missing:
+                    checker.load_warnings.append(zone_checker.CheckWarning(
+                        "layer_failed", f"Snapshot {self.version} has no census tracts for states {missing}", missing))
+        return checker
+
+
+# The version CURRENT points at in root, or directory itself if it is a version
+def open_snapshot(path):
+    path = Path(path)
+    if (path / CURRENT).exists():
+        path = path / (path / CURRENT).read_text().strip()
+    return Snapshot(path)
+
+
+_current = None
+
+
+# The ZONE_SNAPSHOT snapshot, opened once (None when it isn't set). Only
+# file sizes are checked here; `snapshot.py verify` does the checksums.
+def current():
+    global _current
+    if SNAPSHOT and _current is None:
+        snapshot = open_snapshot(SNAPSHOT)
+        bad = snapshot.verify(full=False)
+        if bad:
+            raise SnapshotError(f"Snapshot {snapshot.version} is incomplete: {', '.join(bad)}")
+        _current = snapshot
+    return _current
+
+
+def _layer_entry(relpath, gdf, source_version=None):
+    return {"file": relpath, "features": len(gdf), "source_version": source_version or gdf.attrs.get("version")}
+
+
+# Download and preprocess everything for states into a new version under
+# root, then point CURRENT at it. Returns the new Snapshot.
+def build(root=SNAPSHOT_ROOT, states=None, make_current=True):
+    root = Path(root)
+    states = list(states or zone_checker.STATE_FIPS.values())
+    created = datetime.now(timezone.utc)
+    work = root / f".building-{os.getpid()}-{int(time.time())}"
+    work.mkdir(parents=True)
+    try:
+        def on_progress(layer, done, total, error):
+            status = "failed: " + str(error) if error is not None else "ok"
+            print(f"[{done}/{total}] {layer} {status}", flush=True)
+
+        checker = zone_checker.ZoneChecker(states)
+        checker.load(on_progress=on_progress)
+
+        manifest = {"format": SNAPSHOT_FORMAT, "created_at": created.isoformat(), "states": states,
+                    "tracts": {}, "layers": {}, "failed": {}}
+        (work / "tracts").mkdir()
+        for fip in states:
+            tracts = checker.tracts_for([fip])
+            if len(tracts):
+                relpath = f"tracts/{fip}.parquet"
+                tracts.to_parquet(work / relpath, index=False)
+                manifest["tracts"][fip] = relpath
+
+        print("Building the national tract index...", flush=True)
+        tract_index.NationalTractIndex.build(checker.tracts_gdf).save(work / "tract_index")
+        manifest["tract_index"] = "tract_index"
+
+        checker.eligibility.save(work / "eligibility.parquet")
+        manifest["eligibility"] = "eligibility.parquet"
+
+        (work / "zones").mkdir()
+        if checker.usda_gdf is not None:
+            # State bboxes overlap, so neighbouring pieces share features
+            usda = checker.usda_gdf[~pd.Series(shapely.to_wkb(checker.usda_gdf.geometry.values)).duplicated().to_numpy()]
+            usda.to_parquet(work / "zones/usda.parquet", index=False)
+            pieces = ",".join(str(zone_checker.layer_version(part)) for part in checker.usda_layers(states))
+            manifest["layers"][USDA_LAYER] = _layer_entry("zones/usda.parquet", usda, pieces)
+        # Points in the other states get no USDA answer
+        manifest["usda_states"] = checker.usda_states()
+        for fip in states:
+            if fip not in manifest["usda_states"]:
+                name = f"USDA ineligible areas ({zone_checker.FIPS_STATES.get(fip, fip)})"
+                manifest["failed"][name] = next(
+                    (w.message for w in checker.load_warnings if w.data == name), "not loaded")
+        for _, col_name, _ in checker.zone_columns():
+            layer = checker.zone_layers.get(col_name)
+            if layer is None:
+                manifest["failed"][col_name] = next(
+                    (w.message for w in checker.load_warnings if w.data == col_name), "empty or not loaded")
+                continue
+            relpath = f"zones/{tract_zones.layer_filename(col_name)}"
+            layer.to_parquet(work / relpath, index=False)
+            manifest["layers"][col_name] = _layer_entry(relpath, layer)
+
+        print("Precomputing tract/zone overlap...", flush=True)
+        tract_zones.save_indexes(tract_zones.build_for_checker(checker), work / "tract_zones")
+
+        files = sorted(p for p in work.rglob("*") if p.is_file())
+        manifest["files"] = {p.relative_to(work).as_posix(): {"sha256": file_sha256(p), "bytes": p.stat().st_size}
+                             for p in files}
+        digest = _content_version([entry["sha256"] for entry in manifest["files"].values()]).split(":")[1]
+        manifest["version"] = f"{created.strftime('%Y%m%dT%H%M%SZ')}-{digest[:8]}"
+        _write_json(work / MANIFEST, manifest)
+
+        final = root / manifest["version"]
+        os.replace(work, final)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    if make_current:
+        use(root, manifest["version"])
+    return Snapshot(final)
+
+
+def versions(root=SNAPSHOT_ROOT):
+    root = Path(root)
+    return sorted(p.name for p in root.iterdir() if (p / MANIFEST).exists()) if root.exists() else []
+
+
+def use(root, version):
+    root = Path(root)
+    Snapshot(root / version)
+    tmp = root / f"{CURRENT}.tmp"
+    tmp.write_text(version + "\n")
+    os.replace(tmp, root / CURRENT)
+
+
+# Layers added, removed or changed between two snapshots
+def diff(old, new):
+    changes = []
+    for name in sorted(set(old.manifest["layers"]) | set(new.manifest["layers"])):
+        before = old.manifest["layers"].get(name)
+        after = new.manifest["layers"].get(name)
+        if before is None or after is None:
+            changes.append((name, "added" if before is None else "removed", None))
+        elif old._checksum(before["file"]) != new._checksum(after["file"]):
+            changes.append((name, "changed", f"{before['features']} -> {after['features']} features"))
+    for fip in sorted(set(old.manifest["tracts"]) | set(new.manifest["tracts"])):
+        before = old.manifest["tracts"].get(fip)
+        after = new.manifest["tracts"].get(fip)
+        if before is None or after is None or old._checksum(before) != new._checksum(after):
+            changes.append((f"Census tracts ({zone_checker.FIPS_STATES.get(fip, fip)})", "changed", None))
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and manage offline layer snapshots.")
+    parser.add_argument("--root", default=str(SNAPSHOT_ROOT), help="snapshot root directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = sub.add_parser("build", help="download and preprocess every layer into a new version")
+    build_parser.add_argument("--states", nargs="*", help="state FIPS codes (default: all)")
+    build_parser.add_argument("--no-use", action="store_true", help="don't make the new version current")
+    sub.add_parser("list", help="list versions")
+    verify_parser = sub.add_parser("verify", help="check a version's files against its manifest")
+    verify_parser.add_argument("version", nargs="?", help="default: current")
+    diff_parser = sub.add_parser("diff", help="compare the layers of two versions")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    use_parser = sub.add_parser("use", help="make a version current")
+    use_parser.add_argument("version")
+    args = parser.parse_args()
+    root = Path(args.root)
+
+    if args.command == "build":
+        snapshot = build(root, args.states, make_current=not args.no_use)
+        failed = snapshot.manifest["failed"]
+        print(f"Wrote snapshot {snapshot.version} to {snapshot.directory}"
+              + (f" ({len(failed)} layer(s) failed: {', '.join(failed)})" if failed else ""))
+    elif args.command == "list":
+        current_version = (root / CURRENT).read_text().strip() if (root / CURRENT).exists() else None
+        for version in versions(root):
+            manifest = Snapshot(root / version).manifest
+            size = sum(entry["bytes"] for entry in manifest["files"].values())
+            mark = "*" if version == current_version else " "
+            print(f"{mark} {version}  {len(manifest['states'])} states  {len(manifest['layers'])} layers  "
+                  f"{size / 2 ** 20:.0f} MB")
+    elif args.command == "verify":
+        snapshot = Snapshot(root / args.version) if args.version else open_snapshot(root)
+        bad = snapshot.verify()
+        print(f"{snapshot.version}: " + ("ok" if not bad else f"{len(bad)} bad file(s): {', '.join(bad)}"))
+        raise SystemExit(1 if bad else 0)
+    elif args.command == "diff":
+        changes = diff(Snapshot(root / args.old), Snapshot(root / args.new))
+        for name, change, detail in changes:
+            print(f"{change:8} {name}" + (f" ({detail})" if detail else ""))
+        if not changes:
+            print("No layer changes")
+    elif args.command == "use":
+        use(root, args.version)
+        print(f"Current snapshot: {args.version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+import openpyxl
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+import result_export
+from zone_checker import CheckWarning
+
+# Large uploads are read, checked and written out CHUNK_ROWS rows at a time
+# so memory stays flat no matter how big the file is.
+CHUNK_ROWS = 50_000
+# Rows kept in memory for the on-screen preview and unmatched-points table
+PREVIEW_ROWS = 1_000
+# Input bytes the CSV reader parses at a time
+CSV_BLOCK_BYTES = 4 * 1024 ** 2
+
+COORD_COLS = ["latitude", "longitude"]
+MISSING_COLUMNS_MESSAGE = "Please include 'latitude' and 'longitude' columns in your file."
+
+# A plain decimal number, optionally in exponent notation
+NUMBER_PATTERN = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+
+# Lon/lat boxes (minx, miny, maxx, maxy) around the states and territories
+# with census tracts, a little wider than the coastlines
+US_BOXES = [
+    (-125.0, 24.3, -66.8, 49.5),     # lower 48
+    (-179.3, 51.0, -129.9, 71.5),    # Alaska
+    (172.3, 51.0, 180.0, 53.1),      # Aleutians west of the antimeridian
+    (-178.5, 18.8, -154.7, 28.5),    # Hawaii
+    (-68.0, 17.6, -64.5, 18.6),      # Puerto Rico and the Virgin Islands
+    (144.5, 13.1, 146.2, 20.6),      # Guam and the Northern Mariana Islands
+    (-171.2, -14.7, -168.1, -11.0),  # American Samoa
+]
+
+# Why a row was not checked, in the order the tests are applied
+MISSING = "missing coordinate"
+NOT_A_NUMBER = "not a number"
+SWAPPED = "latitude and longitude look swapped"
+SIGN = "longitude looks like it is missing its minus sign"
+OUT_OF_RANGE = "out of range"
+OUTSIDE_US = "outside the US"
+
+
+class MissingColumnsError(ValueError):
+    pass
+
+
+def _xlsx_chunks(file, chunk_rows):
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(c).strip() if c is not None else "" for c in next(rows, [])]
+        chunk = []
+        start = 0
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=header, index=pd.RangeIndex(start, start + len(chunk)))
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header, index=pd.RangeIndex(start, start + len(chunk)))
+    finally:
+        workbook.close()
+
+
+# Only the coordinate columns are read, as Arrow strings; validate_coordinates
+# parses them without going through Python objects
+def _csv_chunks(file, chunk_rows):
+    try:
+        reader = pa_csv.open_csv(file, read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_BYTES),
+                                 convert_options=pa_csv.ConvertOptions(
+                                     include_columns=COORD_COLS,
+                                     column_types={col: pa.string() for col in COORD_COLS}))
+    except pa.ArrowKeyError:
+        raise MissingColumnsError(MISSING_COLUMNS_MESSAGE)
+    start = 0
+    for batch in reader:
+        for offset in range(0, batch.num_rows, chunk_rows):
+            piece = batch.slice(offset, chunk_rows)
+            chunk = piece.to_pandas(types_mapper=pd.ArrowDtype)
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
+
+
+# Yield the uploaded CSV/XLSX as DataFrames of at most chunk_rows rows,
+# indexed by data row (0 is the row after the header)
+def iter_coordinate_chunks(file, name, chunk_rows=CHUNK_ROWS):
+    if name.endswith(".xlsx"):
+        yield from _xlsx_chunks(file, chunk_rows)
+    else:
+        yield from _csv_chunks(file, chunk_rows)
+
+
+# Float array from a column as read: numeric columns as they are, Arrow
+# strings trimmed and parsed in Arrow, anything else by pd.to_numeric.
+# Values that aren't numbers become NaN.
+def parse_numbers(series):
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return series.to_numpy(dtype=float, na_value=np.nan)
+    if isinstance(series.dtype, pd.ArrowDtype) and pa.types.is_string(series.dtype.pyarrow_dtype):
+        values = pc.utf8_trim_whitespace(pa.array(series.array))
+        numbers = pc.if_else(pc.match_substring_regex(values, NUMBER_PATTERN), values, pa.scalar(None, pa.string()))
+        return pc.cast(numbers, pa.float64()).to_numpy(zero_copy_only=False)
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+
+# Boolean array: which lon/lat fall in one of the US_BOXES
+def in_us(latitude, longitude):
+    inside = np.zeros(len(latitude), dtype=bool)
+    for minx, miny, maxx, maxy in US_BOXES:
+        inside |= (longitude >= minx) & (longitude <= maxx) & (latitude >= miny) & (latitude <= maxy)
+    return inside
+
+
+# Split df into rows worth checking, with float latitude/longitude, and a
+# rejection report (row number in the file counting the header as row 1,
+# the values as given, and the reason). All tests are vectorized; only rows
+# that didn't parse are looked at one by one to tell blanks from junk.
+def validate_coordinates(df):
+    if not set(COORD_COLS) <= set(df.columns):
+        raise MissingColumnsError(MISSING_COLUMNS_MESSAGE)
+    latitude = parse_numbers(df["latitude"])
+    longitude = parse_numbers(df["longitude"])
+    reasons = np.full(len(df), None, dtype=object)
+
+    unparsed = np.isnan(latitude) | np.isnan(longitude)
+    if unparsed.any():
+        given = df.loc[unparsed, COORD_COLS]
+        blank = (given.isna() | given.astype(str).apply(lambda col: col.str.strip() == "")).any(axis=1)
+        reasons[np.flatnonzero(unparsed)] = np.where(blank.to_numpy(), MISSING, NOT_A_NUMBER)
+
+    outside = ~unparsed & ~in_us(latitude, longitude)
+    if outside.any():
+        swapped = outside & in_us(longitude, latitude)
+        sign = outside & ~swapped & (longitude > 0) & in_us(latitude, -longitude)
+        out_of_range = outside & ~swapped & ~sign & ((np.abs(latitude) > 90) | (np.abs(longitude) > 180))
+        reasons[swapped] = SWAPPED
+        reasons[sign] = SIGN
+        reasons[out_of_range] = OUT_OF_RANGE
+        reasons[outside & ~swapped & ~sign & ~out_of_range] = OUTSIDE_US
+
+    rejected = unparsed | outside
+    valid = df[~rejected].copy()
+    valid["latitude"] = latitude[~rejected]
+    valid["longitude"] = longitude[~rejected]
+    rejects = pd.DataFrame({
+        "row": df.index[rejected] + 2,
+        "latitude": df["latitude"][rejected].astype(object).to_numpy(),
+        "longitude": df["longitude"][rejected].astype(object).to_numpy(),
+        "reason": reasons[rejected],
+    })
+    return valid, rejects
+
+
+# Every row of a CSV/XLSX file on disk: (valid rows, rejection report)
+def read_coordinates(path):
+    with open(path, "rb") as f:
+        chunks = [validate_coordinates(chunk) for chunk in iter_coordinate_chunks(f, str(path))]
+    if not chunks:
+        return pd.DataFrame({col: [] for col in COORD_COLS}), pd.DataFrame(columns=["row", *COORD_COLS, "reason"])
+    return (pd.concat([valid for valid, _ in chunks]),
+            pd.concat([rejects for _, rejects in chunks], ignore_index=True))
+
+
+# reason_counts maps each reason to its number of rows; rows are the
+# rejection report (or its first rows)
+def rejected_warning(reason_counts, rows):
+    summary = ", ".join(f"{count} {reason}" for reason, count in reason_counts.items())
+    return CheckWarning("rejected_rows", f"{sum(reason_counts.values())} row(s) were not checked: {summary}.", rows)
+
+
+# Merge the warnings from every chunk: unmatched points are summed into one
+# warning, everything else is reported once
+def merge_warnings(checker, warnings):
+    merged = []
+    seen = set()
+    unmatched = []
+    for warning in warnings:
+        if warning.code == "unmatched_points":
+            unmatched.append(warning.data)
+        elif warning.message not in seen:
+            seen.add(warning.message)
+            merged.append(warning)
+    if unmatched:
+        count = sum(len(rows) for rows in unmatched)
+        merged.append(checker.unmatched_warning(pd.concat(unmatched).head(PREVIEW_ROWS), count))
+    return merged
+
+
+# Check every chunk and append the results to out_path, in the format its
+# extension names (see result_export.py). Rows that fail
+# validate_coordinates never reach the checker; they are reported in a
+# "rejected_rows" warning and, with rejects_path, written there in full.
+# on_progress(rows_done) is called after each chunk. Returns
+# (rows written, preview DataFrame, merged warnings).
+def check_stream(checker, chunks, out_path, on_progress=None, rejects_path=None):
+    rows = 0
+    preview = []
+    warnings = []
+    reason_counts = {}
+    rejected_preview = []
+    rejected_rows = 0
+    with result_export.ResultWriter(out_path) as out, \
+            (open(rejects_path, "w", newline="") if rejects_path else nullcontext()) as rejects_out:
+        for chunk in chunks:
+            chunk, rejects = validate_coordinates(chunk)
+            if not rejects.empty:
+                for reason, count in rejects["reason"].value_counts().items():
+                    reason_counts[reason] = reason_counts.get(reason, 0) + int(count)
+                if rejected_rows < PREVIEW_ROWS:
+                    rejected_preview.append(rejects.head(PREVIEW_ROWS - rejected_rows))
+                if rejects_out is not None:
+                    rejects.to_csv(rejects_out, index=False, header=rejected_rows == 0)
+                rejected_rows += len(rejects)
+            if chunk.empty:
+                continue
+            results, chunk_warnings = checker.check(chunk)
+            out.write(results)
+            warnings.extend(chunk_warnings)
+
+            if rows < PREVIEW_ROWS:
+                preview.append(results.head(PREVIEW_ROWS - rows))
+            rows += len(results)
+            if on_progress is not None:
+                on_progress(rows)
+
+    preview = pd.concat(preview, ignore_index=True) if preview else pd.DataFrame()
+    warnings = merge_warnings(checker, warnings)
+    if rejected_rows:
+        warnings.append(rejected_warning(reason_counts, pd.concat(rejected_preview, ignore_index=True)))
+    return rows, preview, warnings
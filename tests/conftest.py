@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import result_memo
+import zone_checker
+
+
+# Two tracts in Colorado and two in Florida, one degree square each
+@pytest.fixture
+def tracts():
+    rows = [("08001000100", box(-105, 39, -104, 40)), ("08001000200", box(-104, 39, -103, 40)),
+            ("12003000100", box(-82, 29, -81, 30)), ("12003000200", box(-81, 29, -80, 30))]
+    gdf = gpd.GeoDataFrame({"GEOID": [geoid for geoid, _ in rows]}, geometry=[geom for _, geom in rows],
+                           crs="EPSG:4326")
+    # As if loaded from one revision of the tract files
+    gdf.attrs["version"] = "hf:test"
+    return gdf
+
+
+@pytest.fixture
+def eligibility():
+    return pd.DataFrame({"GEOID": ["08001000100", "08001000200", "12003000100", "12003000200"],
+                         "NMTC Eligibility": ["Eligible", "Not Eligible", "Eligible", "Not Eligible"],
+                         "Opportunity Zone": ["No", "No", "Low-Income Community", "No"]})
+
+
+# The western half of every tract
+@pytest.fixture
+def zone():
+    return gpd.GeoDataFrame(geometry=[box(-105, 39, -104.5, 40), box(-82, 29, -81.5, 30)], crs="EPSG:4326")
+
+
+# A fully loaded checker for fips_codes (Colorado and Florida by default)
+# that never downloads anything; zone_layers overrides the zone layers
+# (None = failed to load)
+@pytest.fixture
+def make_checker(tracts, eligibility, zone):
+    def make(zone_layers=None, fips_codes=("08", "12"), memo=None):
+        layers = {col_name: zone for fip in fips_codes
+                  for col_name, _ in zone_checker.STATE_ZONE_LOADERS.get(fip, [])}
+        layers.update(zone_layers or {})
+        return zone_checker.ZoneChecker(list(fips_codes), tracts_gdf=tracts[tracts["GEOID"].str[:2].isin(fips_codes)],
+                                        usda_gdf=zone, eligibility=eligibility, zone_layers=layers,
+                                        memo=memo if memo is not None else result_memo.ResultMemo())
+    return make
+
+
+def points(coordinates):
+    return pd.DataFrame(coordinates, columns=["latitude", "longitude"])
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+import requests
+from shapely.geometry import box
+
+import arcgis
+
+QUERY_URL = "https://arcgis.test/FeatureServer/0/query"
+
+
+def respond(monkeypatch, body, status=200):
+    def request(method, url, **kwargs):
+        resp = requests.Response()
+        resp.status_code = status
+        resp.url = url
+        resp._content = json.dumps(body).encode() if not isinstance(body, bytes) else body
+        return resp
+    monkeypatch.setattr(arcgis, "_request", request)
+
+
+@pytest.mark.parametrize("fmt", ["json", "geojson"])
+def test_error_body_is_raised(monkeypatch, fmt):
+    respond(monkeypatch, b' {"error" : {"code": 400, "message": "Invalid query"}}')
+    with pytest.raises(arcgis.ArcGISError) as error:
+        arcgis._read_page(QUERY_URL, {"f": fmt})
+    assert error.value.code == 400
+
+
+def test_quantized_page(monkeypatch):
+    # One square, as an absolute grid position and then deltas, with y
+    # counted down from the upper left corner
+    respond(monkeypatch, {
+        "spatialReference": {"wkid": 4326},
+        "transform": {"originPosition": "upperLeft", "scale": [0.5, 0.5], "translate": [-105, 40]},
+        "features": [{"attributes": {"OBJECTID": 7},
+                      "geometry": {"rings": [[[0, 0], [2, 0], [0, 2], [-2, 0], [0, -2]]]}}],
+    })
+    gdf = arcgis._read_page(QUERY_URL, {"f": "json"})
+    assert gdf["OBJECTID"].tolist() == [7]
+    assert gdf.crs == "EPSG:4326"
+    assert gdf.geometry.iloc[0].equals(box(-105, 39, -104, 40))
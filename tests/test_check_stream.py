@@ -0,0 +1,33 @@
+import pandas as pd
+
+import result_export
+import streaming
+from conftest import points
+
+
+def test_failed_layer_keeps_columns_stable_across_chunks(make_checker, tmp_path):
+    checker = make_checker({"CO Enterprise Zone": None})
+    chunks = [points([(29.5, -81.8), (29.5, -80.5)]),   # Florida only
+              points([(39.5, -104.8), (39.5, -103.5)])]  # Colorado, where the layer failed
+
+    for suffix in (".csv", ".parquet"):
+        out_path = tmp_path / f"results{suffix}"
+        rows, preview, _ = streaming.check_stream(checker, iter(chunks), out_path)
+
+        results = result_export.read_results(out_path)
+        assert rows == len(results) == 4
+        assert list(results.columns) == list(preview.columns)
+        assert "CO Enterprise Zone" in results.columns
+        assert results["CO Enterprise Zone"].isna().all()
+        enhanced = results["CO Enhanced Rural Enterprise Zone"]
+        assert enhanced.isna().tolist() == [True, True, False, False]
+        assert enhanced.iloc[2:].astype(str).tolist() == ["Yes", "No"]
+
+
+def test_chunk_columns_do_not_depend_on_rows(make_checker):
+    checker = make_checker({"CO Enterprise Zone": None})
+    florida, _ = checker.check(points([(29.5, -81.8)]))
+    colorado, _ = checker.check(points([(39.5, -104.8)]))
+    assert list(florida.columns) == list(colorado.columns)
+    assert pd.isna(colorado.loc[0, "CO Enterprise Zone"])
+    assert colorado.loc[0, "CO Enhanced Rural Enterprise Zone"] == "Yes"
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+import eligibility_index
+from conftest import points
+
+
+def test_geoid_round_trip():
+    ints = eligibility_index.geoid_ints(["08001000100", None, "12003000200", ""])
+    assert ints.tolist() == [8001000100, eligibility_index.MISSING, 12003000200, eligibility_index.MISSING]
+    assert eligibility_index.geoid_strings(ints).tolist() == ["08001000100", None, "12003000200", None]
+    assert eligibility_index.state_codes(ints).tolist() == [8, eligibility_index.MISSING, 12, eligibility_index.MISSING]
+
+
+def test_geoid_strings_of_nothing():
+    strings = eligibility_index.geoid_strings(np.array([], dtype=np.int64))
+    assert len(strings) == 0 and strings.dtype == object
+
+
+def test_lookup_matches_the_flags_table(eligibility, tmp_path):
+    index = eligibility_index.EligibilityIndex.from_frame(eligibility)
+    index.save(tmp_path / "flags.parquet")
+    for index in (index, eligibility_index.EligibilityIndex.read(tmp_path / "flags.parquet")):
+        flags = index.lookup(eligibility_index.geoid_ints(["12003000100", "99999999999", None, "08001000200"]))
+        assert flags["NMTC Eligibility"].tolist()[::3] == ["Eligible", "Not Eligible"]
+        assert flags["Opportunity Zone"].tolist()[0] == "Low-Income Community"
+        assert flags.iloc[1:3].isna().all().all()
+
+
+def test_counties():
+    table = eligibility_index.county_table({"12003"})
+    ints = eligibility_index.geoid_ints(["12003000100", "12005000100", None])
+    assert eligibility_index.in_counties(table, ints).tolist() == [True, False, False]
+
+
+def test_check_with_no_points(make_checker):
+    results, warnings = make_checker().check(points([]))
+    assert len(results) == 0 and warnings == []
+    assert "USDA Eligible" in results.columns
+    results, _ = make_checker().check_arrays([], [])
+    assert len(results) == 0
@@ -0,0 +1,27 @@
+import zone_checker
+from conftest import points
+
+
+def test_failed_layer_is_not_reloaded_on_every_check(make_checker, monkeypatch):
+    calls = []
+
+    def failing_loader():
+        calls.append(1)
+        raise ConnectionError("host down")
+
+    monkeypatch.setitem(zone_checker.STATE_ZONE_LOADERS, "08", [("CO Enterprise Zone", failing_loader)])
+    checker = make_checker()
+    del checker.zone_layers["CO Enterprise Zone"]
+    for _ in range(3):
+        _, warnings = checker.check(points([(39.5, -104.8)]))
+    assert len(calls) == 1
+    assert [w.data for w in checker.load_warnings] == ["CO Enterprise Zone"]
+    assert [w.code for w in warnings].count("layer_failed") == 1
+
+    # Due again: retried once, and the warning goes away with the failure
+    monkeypatch.setitem(zone_checker.STATE_ZONE_LOADERS, "08", [("CO Enterprise Zone", lambda: checker.usda_gdf)])
+    checker._failed["CO Enterprise Zone"] = 0
+    checker._retry_at = 0
+    results, _ = checker.check(points([(39.5, -104.8)]))
+    assert checker.load_warnings == []
+    assert results.loc[0, "CO Enterprise Zone"] == "Yes"
@@ -0,0 +1,19 @@
+import pandas as pd
+
+import parallel
+from conftest import points
+
+
+def test_partitions_cover_every_row():
+    df = points([(39.5, -104.5), (39.6, -104.4), (29.5, -81.5), (29.5, -80.5), (39.5, -103.5)])
+    parts = parallel.partition(df, 3)
+    assert sorted(pd.concat(parts).index) == list(df.index)
+    # Points in the same grid cell stay together
+    assert any({0, 1} <= set(part.index) for part in parts)
+
+
+def test_no_points(make_checker, monkeypatch):
+    monkeypatch.setattr(parallel, "_warm", lambda fips_codes, df: make_checker())
+    results, warnings = parallel.check_parallel(points([]), ("08", "12"), workers=2)
+    assert len(results) == 0 and warnings == []
+    assert "GEOID" in results.columns
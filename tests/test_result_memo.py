@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+import result_memo
+from conftest import points
+
+
+def test_store_round_trip_and_versions(tmp_path):
+    store = result_memo.ResultStore(tmp_path / "results.sqlite")
+    keys = np.array([1, 2, 2 ** 63 + 5], dtype=np.uint64)
+    store.put(("GEOID", "v1"), keys, [10, 20, 30])
+
+    hit, values = store.get(("GEOID", "v1"), np.array([2 ** 63 + 5, 7, 1], dtype=np.uint64))
+    assert hit.tolist() == [True, False, True]
+    assert values[hit].tolist() == [30, 10]
+
+    # Another version misses, and writing it drops the old one
+    assert not store.get(("GEOID", "v2"), keys)[0].any()
+    store.put(("GEOID", "v2"), keys[:1], [11])
+    assert not store.get(("GEOID", "v1"), keys)[0].any()
+    assert store.stats() == {"GEOID": 1}
+
+
+def test_local_versions_are_not_persisted(tmp_path):
+    store = result_memo.ResultStore(tmp_path / "results.sqlite")
+    memo = result_memo.ResultMemo(store=store)
+    memo.put(("USDA Eligible", "local-3"), np.array([1], dtype=np.uint64), [True])
+    assert store.stats() == {}
+    assert not result_memo.persistent(("x", "local-3"))
+    assert result_memo.persistent(("x", "hf:abc"))
+
+
+def test_snapped_points_share_a_key():
+    latitude, longitude = result_memo.snap([39.5, 39.5 + 1e-8, 39.5001], [-104.8, -104.8, -104.8])
+    keys = result_memo.point_keys(latitude, longitude)
+    assert keys[0] == keys[1] != keys[2]
+
+
+def test_selections_sharing_a_store_keep_their_own_states(make_checker, tmp_path):
+    store = result_memo.ResultStore(tmp_path / "results.sqlite")
+    both = make_checker(memo=result_memo.ResultMemo(store=store))
+    colorado_point = points([(39.5, -104.8)])
+    results, _ = both.check(colorado_point)
+    assert results.loc[0, "GEOID"] == "08001000100"
+
+    # A Florida-only checker in a later process, reading the same store
+    florida = make_checker(fips_codes=("12",), memo=result_memo.ResultMemo(store=store))
+    results, warnings = florida.check(colorado_point)
+    assert pd.isna(results.loc[0, "GEOID"]) and pd.isna(results.loc[0, "State"])
+    assert [w.code for w in warnings] == ["unmatched_points"]
+
+    # The Colorado answer is still there for a checker that covers Colorado
+    again = make_checker(memo=result_memo.ResultMemo(store=store))
+    results, _ = again.check(colorado_point)
+    assert results.loc[0, "GEOID"] == "08001000100"
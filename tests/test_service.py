@@ -0,0 +1,25 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import service
+
+
+def test_endpoints_respond(make_checker):
+    async def run():
+        async with TestClient(TestServer(service.create_app(make_checker()))) as client:
+            resp = await client.post("/check/batch", json={"points": [{"latitude": 39.5, "longitude": -104.8}]})
+            assert resp.status == 200
+            body = await resp.json()
+            assert body["results"][0]["GEOID"] == "08001000100"
+
+            resp = await client.get("/metrics")
+            assert resp.status == 200
+            body = await resp.json()
+            assert body["batches"] >= 1
+            assert "stages" in body["pipeline"]
+
+            resp = await client.get("/health")
+            assert resp.status == 200
+
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import Point, box
+
+import eligibility_index
+import tract_zones
+from conftest import points
+
+
+def test_lookup(tracts):
+    # Covers the first tract, half of the third and none of the others
+    zone = gpd.GeoDataFrame(geometry=[box(-105, 39, -104, 40), box(-82, 29, -81.5, 30)], crs="EPSG:4326")
+    index = tract_zones.TractZoneIndex.build(tracts, zone)
+    assert dict(zip(index.geoids.tolist(), index.status.tolist())) == {
+        8001000100: tract_zones.IN, 8001000200: tract_zones.OUT,
+        12003000100: tract_zones.PARTIAL, 12003000200: tract_zones.OUT}
+
+    geoids = eligibility_index.geoid_ints(["08001000100", "08001000200", "12003000100", "12003000100", None])
+    geoms = [Point(-104.5, 39.5), Point(-103.5, 39.5), Point(-81.8, 29.5), Point(-81.2, 29.5), Point(-90, 35)]
+    assert index.lookup(geoids, geoms).tolist() == [True, False, True, False, False]
+
+
+def test_save_and_read_keep_the_layer_version(tracts, zone, tmp_path):
+    index = tract_zones.TractZoneIndex.build(tracts, zone, "cache:v1")
+    index.save(tmp_path / "zone.parquet")
+    read = tract_zones.TractZoneIndex.read(tmp_path / "zone.parquet")
+    assert read.version == "cache:v1"
+    assert np.array_equal(read.geoids, index.geoids) and np.array_equal(read.status, index.status)
+    assert read.crs == index.crs
+
+    # A version only this process knows isn't written
+    tract_zones.TractZoneIndex.build(tracts, zone, "local-3").save(tmp_path / "local.parquet")
+    assert "version" not in vars(tract_zones.TractZoneIndex.read(tmp_path / "local.parquet"))
+
+
+def test_stale_indexes_are_not_loaded(make_checker, tmp_path):
+    checker = make_checker()
+    checker.usda_gdf.attrs["version"] = "cache:v2"
+    indexes = tract_zones.build_for_checker(checker)
+    indexes["USDA Eligible"].version = "cache:v1"
+    tract_zones.save_indexes(indexes, tmp_path)
+
+    checker = make_checker().load_precomputed(tmp_path)
+    # The zone layers are still the version their indexes were built from
+    assert set(checker.tract_zones) == set(indexes) - {"USDA Eligible"}
+    results, _ = checker.check(points([(39.5, -104.8), (39.5, -104.2)]))
+    assert results["USDA Eligible"].tolist() == ["No", "Yes"]
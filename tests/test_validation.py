@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+import streaming
+
+
+def test_rejection_reasons():
+    df = pd.DataFrame({
+        "latitude": ["39.5", "", "abc", "-104.8", "39.5", "95", "51.5", " 18.4 "],
+        "longitude": ["-104.8", "-104.8", "-104.8", "39.5", "104.8", "-104.8", "-0.1", "-66.1"],
+    })
+    valid, rejects = streaming.validate_coordinates(df)
+    assert valid.index.tolist() == [0, 7]
+    assert valid["latitude"].tolist() == [39.5, 18.4]
+    assert rejects["row"].tolist() == [3, 4, 5, 6, 7, 8]
+    assert rejects["reason"].tolist() == [streaming.MISSING, streaming.NOT_A_NUMBER, streaming.SWAPPED,
+                                          streaming.SIGN, streaming.OUT_OF_RANGE, streaming.OUTSIDE_US]
+    # Values are reported as given
+    assert rejects["latitude"].tolist()[:3] == ["", "abc", "-104.8"]
+
+
+def test_numeric_columns():
+    df = pd.DataFrame({"latitude": [29.5, None, 181.0], "longitude": [-81.8, -81.8, 45.0]})
+    valid, rejects = streaming.validate_coordinates(df)
+    assert valid.index.tolist() == [0]
+    assert rejects["reason"].tolist() == [streaming.MISSING, streaming.OUT_OF_RANGE]
+
+
+def test_missing_columns():
+    with pytest.raises(streaming.MissingColumnsError):
+        streaming.validate_coordinates(pd.DataFrame({"lat": [1.0], "lon": [2.0]}))
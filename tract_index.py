@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import threading
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import shapely
+
+import eligibility_index
+
+# National point -> tract index. Tract polygons for every state are kept as
+# WKB in one parquet file and a regular lon/lat grid maps each cell to the
+# tracts whose bounding box touches it. The grid arrays are memory mapped,
+# and a tract polygon is only decoded the first time a point lands near it.
+INDEX_DIR = Path(os.environ.get("ZONE_TRACT_INDEX", Path.home() / ".cache" / "zone-check" / "tract_index"))
+CELL_SIZE = 0.25
+GRID_COLS = int(360 / CELL_SIZE)
+
+
+def cell_ids(lon, lat, cell_size=CELL_SIZE):
+    ix = np.floor((np.asarray(lon, dtype=float) + 180) / cell_size).astype(np.int64)
+    iy = np.floor((np.asarray(lat, dtype=float) + 90) / cell_size).astype(np.int64)
+    return iy * int(360 / cell_size) + ix
+
+
+class NationalTractIndex:
+
+    def __init__(self, geoids, wkb, cells, offsets, members, state_bounds, cell_size=CELL_SIZE, version=None):
+        self.geoids = geoids
+        self.wkb = wkb
+        # CSR layout: tracts touching cells[i] are members[offsets[i]:offsets[i + 1]]
+        self.cells = cells
+        self.offsets = offsets
+        self.members = members
+        self.state_bounds = state_bounds
+        self.cell_size = cell_size
+        # Version of the tract files it was built from (see zone_checker.layer_version)
+        if version is not None:
+            self.version = version
+        self._geoms = np.full(len(geoids), None, dtype=object)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, tracts_gdf, cell_size=CELL_SIZE):
+        tracts_gdf = tracts_gdf.to_crs("EPSG:4326").reset_index(drop=True)
+        geoids = eligibility_index.geoid_ints(tracts_gdf["GEOID"])
+        bounds = tracts_gdf.geometry.bounds.to_numpy()
+
+        # Every (cell, tract) pair where the tract's bbox touches the cell
+        cols = int(360 / cell_size)
+        x0 = np.floor((bounds[:, 0] + 180) / cell_size).astype(np.int64)
+        x1 = np.floor((bounds[:, 2] + 180) / cell_size).astype(np.int64)
+        y0 = np.floor((bounds[:, 1] + 90) / cell_size).astype(np.int64)
+        y1 = np.floor((bounds[:, 3] + 90) / cell_size).astype(np.int64)
+        cell_list = []
+        tract_list = []
+        for i in range(len(tracts_gdf)):
+            xs, ys = np.meshgrid(np.arange(x0[i], x1[i] + 1), np.arange(y0[i], y1[i] + 1))
+            cell_list.append((ys * cols + xs).ravel())
+            tract_list.append(np.full(xs.size, i, dtype=np.int64))
+        pair_cells = np.concatenate(cell_list)
+        pair_tracts = np.concatenate(tract_list)
+
+        order = np.lexsort((pair_tracts, pair_cells))
+        pair_cells = pair_cells[order]
+        cells, starts = np.unique(pair_cells, return_index=True)
+        offsets = np.append(starts, len(pair_cells)).astype(np.int64)
+
+        states = tracts_gdf["GEOID"].str[:2]
+        state_bounds = {fip: tuple(float(v) for v in tracts_gdf[states == fip].total_bounds)
+                        for fip in sorted(states.unique())}
+        wkb = np.asarray(shapely.to_wkb(tracts_gdf.geometry.values), dtype=object)
+        return cls(geoids, wkb, cells, offsets, pair_tracts[order], state_bounds, cell_size,
+                   tracts_gdf.attrs.get("version"))
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame({"GEOID": self.geoids, "wkb": self.wkb}).to_parquet(directory / "tracts.parquet", index=False)
+        for name in ("cells", "offsets", "members"):
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        with open(directory / "meta.json", "w") as f:
+            json.dump({"cell_size": self.cell_size, "state_bounds": self.state_bounds,
+                       "version": getattr(self, "version", None)}, f)
+
+    @classmethod
+    def read(cls, directory):
+        directory = Path(directory)
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        table = pq.read_table(directory / "tracts.parquet", memory_map=True)
+        arrays = [np.load(directory / f"{name}.npy", mmap_mode="r") for name in ("cells", "offsets", "members")]
+        # Indexes saved without a version are versioned by when they were built
+        version = meta.get("version") or f"tract_index@{int((directory / 'tracts.parquet').stat().st_mtime)}"
+        return cls(table.column("GEOID").to_numpy(), table.column("wkb").to_numpy(zero_copy_only=False),
+                   *arrays, {k: tuple(v) for k, v in meta["state_bounds"].items()}, meta["cell_size"], version)
+
+    def _geometries(self, idx):
+        idx = np.unique(idx)
+        with self._lock:
+            todo = idx[[self._geoms[i] is None for i in idx]]
+            if len(todo):
+                self._geoms[todo] = shapely.from_wkb(self.wkb[todo])
+        return self._geoms
+
+    # int64 GEOID of the tract containing each lon/lat (MISSING if none)
+    def lookup(self, lon, lat):
+        lon = np.asarray(lon, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        result = np.full(len(lon), eligibility_index.MISSING, dtype=np.int64)
+
+        cells = cell_ids(lon, lat, self.cell_size)
+        pos = np.minimum(np.searchsorted(self.cells, cells), len(self.cells) - 1)
+        found = self.cells[pos] == cells
+        starts = np.where(found, self.offsets[pos], 0)
+        counts = np.where(found, self.offsets[np.minimum(pos + 1, len(self.offsets) - 1)] - starts, 0)
+        if counts.sum() == 0:
+            return result
+
+        # One row per (point, candidate tract), tested in a single vectorized call
+        point_rep = np.repeat(np.arange(len(lon)), counts)
+        within = np.arange(len(point_rep)) - np.repeat(np.cumsum(counts) - counts, counts)
+        candidates = np.asarray(self.members[np.repeat(starts, counts) + within])
+        geoms = self._geometries(candidates)
+        hit = shapely.contains_xy(geoms[candidates], lon[point_rep], lat[point_rep])
+
+        # Keep the first matching tract per point, as the state-by-state join does
+        points_hit = point_rep[hit]
+        first = np.unique(points_hit, return_index=True)[1]
+        result[points_hit[first]] = self.geoids[candidates[hit][first]]
+        return result
+
+    # Tract polygons for the given states as a GeoDataFrame
+    def tracts_for(self, fips_codes):
+        states = self.geoids // eligibility_index.STATE_DIVISOR
+        idx = np.flatnonzero(np.isin(states, [int(f) for f in fips_codes]))
+        geoms = self._geometries(idx)
+        return gpd.GeoDataFrame({"GEOID": eligibility_index.geoid_strings(self.geoids[idx])},
+                                geometry=list(geoms[idx]), crs="EPSG:4326")
+
+
+_loaded = None
+_loaded_lock = threading.Lock()
+
+
+# Shared index, read on first use (None if it hasn't been built)
+def get_index(directory=INDEX_DIR):
+    global _loaded
+    with _loaded_lock:
+        if _loaded is None and (Path(directory) / "meta.json").exists():
+            _loaded = NationalTractIndex.read(directory)
+    return _loaded
+
+
+def main():
+    import zone_checker
+
+    parser = argparse.ArgumentParser(description="Build the national point-in-tract index.")
+    parser.add_argument("--out", default=str(INDEX_DIR), help="output directory")
+    args = parser.parse_args()
+
+    tracts_gdf = zone_checker.load_states_tracts(list(zone_checker.STATE_FIPS.values()))
+    index = NationalTractIndex.build(tracts_gdf)
+    index.save(args.out)
+    print(f"Indexed {len(index.geoids)} tracts in {len(index.cells)} grid cells -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import re
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+
+import eligibility_index
+
+# Tract -> zone precomputation. Each zone layer is intersected with the
+# tracts once, offline, and every tract is marked as fully outside, fully
+# inside, or straddling the zone boundary. Only straddling tracts keep a
+# geometry (the piece of the tract inside the zone), so a point lookup is a
+# GEOID search plus, for straddling tracts only, one exact point test.
+OUT = 0
+IN = 1
+PARTIAL = 2
+# Parquet metadata key holding the version of the layer an index was built from
+VERSION_KEY = b"layer_version"
+
+
+class TractZoneIndex:
+
+    def __init__(self, geoids, status, pieces, crs, version=None):
+        self.geoids = geoids
+        self.status = status
+        # geometry array aligned with geoids, None unless status is PARTIAL
+        self.pieces = pieces
+        self.crs = crs
+        # Version of the zone layer this was built from (see
+        # zone_checker.layer_version); unset when not known
+        if version is not None:
+            self.version = version
+
+    @classmethod
+    def build(cls, tracts_gdf, zone_gdf, version=None):
+        zone_gdf = zone_gdf.to_crs(tracts_gdf.crs)
+        tract_geoms = tracts_gdf.geometry.values
+        zone_geoms = zone_gdf.geometry.values
+
+        tract_idx, zone_idx = zone_gdf.sindex.query(tract_geoms, predicate="intersects")
+        status = np.full(len(tracts_gdf), OUT, dtype=np.int8)
+        kept = np.full(len(tracts_gdf), None, dtype=object)
+        if len(tract_idx):
+            pieces = gpd.GeoDataFrame(
+                {"tract": tract_idx},
+                geometry=shapely.intersection(tract_geoms[tract_idx], zone_geoms[zone_idx]),
+                crs=tracts_gdf.crs,
+            )
+            # Zone polygons can overlap, so merge each tract's pieces first
+            merged = pieces.dissolve("tract")
+            idx = merged.index.to_numpy()
+            inside = merged.geometry.values
+            full = shapely.covers(inside, tract_geoms[idx])
+            touching = shapely.area(inside) == 0
+            status[idx[full]] = IN
+            partial = ~full & ~touching
+            status[idx[partial]] = PARTIAL
+            kept[idx[partial]] = inside[partial]
+
+        ints = eligibility_index.geoid_ints(tracts_gdf["GEOID"])
+        order = np.argsort(ints, kind="stable")
+        return cls(ints[order], status[order], kept[order], tracts_gdf.crs, version)
+
+    @classmethod
+    def read(cls, path):
+        table = pq.read_table(path)
+        gdf = gpd.GeoDataFrame.from_arrow(table)
+        version = (table.schema.metadata or {}).get(VERSION_KEY)
+        return cls(gdf["GEOID"].to_numpy(dtype=np.int64), gdf["status"].to_numpy(dtype=np.int8),
+                   np.asarray(gdf.geometry.values, dtype=object), gdf.crs,
+                   None if version is None else version.decode())
+
+    def save(self, path):
+        gdf = gpd.GeoDataFrame({"GEOID": self.geoids, "status": self.status},
+                               geometry=gpd.GeoSeries(list(self.pieces), crs=self.crs))
+        table = pa.table(gdf.to_arrow(index=False))
+        version = vars(self).get("version")
+        # local- versions only mean something inside this process
+        if version is not None and not version.startswith("local-"):
+            table = table.replace_schema_metadata({**table.schema.metadata, VERSION_KEY: version.encode()})
+        pq.write_table(table, path)
+
+    # Boolean array: which points are within the zone. geoids are the int64
+    # tract GEOIDs of the points and points their geometries in self.crs.
+    def lookup(self, geoids, points):
+        geoids = np.asarray(geoids, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.geoids, geoids), len(self.geoids) - 1)
+        found = self.geoids[pos] == geoids
+        status = np.where(found, self.status[pos], OUT)
+
+        result = status == IN
+        partial = np.flatnonzero(status == PARTIAL)
+        if len(partial):
+            result[partial] = shapely.within(np.asarray(points)[partial], self.pieces[pos[partial]])
+        return result
+
+
+def layer_filename(name):
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") + ".parquet"
+
+
+# Index every loaded layer of a ZoneChecker. State zone layers are only
+# built over that state's tracts, since other states get N/A anyway.
+def build_for_checker(checker):
+    indexes = {}
+    if checker.usda_gdf is not None:
+        indexes["USDA Eligible"] = TractZoneIndex.build(checker.tracts_for(checker.usda_states()), checker.usda_gdf,
+                                                        checker.source_version("USDA Eligible"))
+    for fip, col_name, _ in checker.zone_columns():
+        zone_gdf = checker.zone_layers.get(col_name)
+        if zone_gdf is None:
+            continue
+        indexes[col_name] = TractZoneIndex.build(checker.tracts_for([fip]), zone_gdf, checker.source_version(col_name))
+    return indexes
+
+
+def save_indexes(indexes, directory):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, index in indexes.items():
+        index.save(directory / layer_filename(name))
+
+
+def load_indexes(names, directory):
+    directory = Path(directory)
+    return {name: TractZoneIndex.read(directory / layer_filename(name))
+            for name in names
+            if (directory / layer_filename(name)).exists()}
+
+
+def main():
+    import zone_checker
+
+    parser = argparse.ArgumentParser(description="Precompute tract/zone overlap for the given states.")
+    parser.add_argument("fips", nargs="+", help="state FIPS codes, e.g. 12 08")
+    parser.add_argument("--out", default="tract_zones", help="output directory")
+    args = parser.parse_args()
+
+    checker = zone_checker.ZoneChecker(args.fips).load()
+    for warning in checker.load_warnings:
+        print(warning.message)
+    indexes = build_for_checker(checker)
+    save_indexes(indexes, args.out)
+    for name, index in indexes.items():
+        counts = pd.Series(index.status).value_counts().reindex([OUT, IN, PARTIAL], fill_value=0)
+        print(f"{name}: {counts[IN]} in, {counts[OUT]} out, {counts[PARTIAL]} straddling")
+
+
+if __name__ == "__main__":
+    main()
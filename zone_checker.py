@@ -0,0 +1,651 @@
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import lru_cache
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyproj
+
+import EZ_loaders
+import eligibility_index
+import layer_cache
+import metrics
+import result_memo
+import tract_index as national_tract_index
+import tract_zones
+
+STATE_FIPS = {
+    "Alabama": "01", "Alaska": "02", "American Samoa": "60", "Arizona": "04", "Arkansas": "05",
+    "California": "06", "Colorado": "08", "Connecticut": "09", "Delaware": "10", "District of Columbia": "11",
+    "Florida": "12", "Georgia": "13", "Guam": "66", "Hawaii": "15", "Idaho": "16",
+    "Illinois": "17", "Indiana": "18", "Iowa": "19", "Kansas": "20",
+    "Kentucky": "21", "Louisiana": "22", "Maine": "23", "Maryland": "24", "Massachusetts": "25",
+    "Michigan": "26", "Minnesota": "27", "Mississippi": "28", "Missouri": "29",
+    "Montana": "30", "Nebraska": "31", "Nevada": "32", "New Hampshire": "33",
+    "New Jersey": "34", "New Mexico": "35", "New York": "36", "North Carolina": "37",
+    "North Dakota": "38", "North Mariana Islands": "69", "Ohio": "39", "Oklahoma": "40", "Oregon": "41",
+    "Pennsylvania": "42", "Puerto Rico": "72", "Rhode Island": "44", "South Carolina": "45", "South Dakota": "46", "Tennessee": "47",
+    "Texas": "48", "Utah": "49", "Vermont": "50", "Virgin Islands": "78", "Virginia": "51", "Washington": "53",
+    "West Virginia": "54", "Wisconsin": "55", "Wyoming": "56",
+}
+FIPS_STATES = {v: k for k, v in STATE_FIPS.items()}
+STATE_CODE_NAMES = {int(v): k for k, v in STATE_FIPS.items()}
+
+# Map of state fip codes to their Enterprise Zone loaders
+STATE_ZONE_LOADERS = {
+    "08": [("CO Enterprise Zone", EZ_loaders.load_co_ez_data),
+           ("CO Enhanced Rural Enterprise Zone", EZ_loaders.load_co_erez_data)],
+    "12": [("FL Rural Area Opportunity Zone", EZ_loaders.load_fl_rao_data)],
+    "15": [("HI Enterprise Zone", EZ_loaders.load_hi_ez_data)],
+    "17": [("IL Enterprise Zone", EZ_loaders.load_il_ez_data)],
+    "24": [("MD Enterprise Zone", EZ_loaders.load_md_ez_data)],
+    "29": [("MO Enhanced Enterprise Zone", EZ_loaders.load_mo_ez_data)],
+    "31": [("NE Innovation Hub", EZ_loaders.load_ne_ihub_data),
+           ("NE Enterprise Zone", EZ_loaders.load_ne_ez_data)],
+    "48": [("TX Enterprise Zone", EZ_loaders.load_tx_ez_data)],
+    "51": [("VA Enterprise Zone", EZ_loaders.load_va_ez_data)],
+}
+
+# Zones that are whole counties, so they only need the GEOID. Stored as
+# county lookup tables (see eligibility_index.county_table).
+STATE_COUNTY_ZONES = {
+    "12": [("FL Rural Job Tax Credit Zone", eligibility_index.county_table(EZ_loaders.FL_RJTC_COUNTIES))],
+    "01": [("AL Enterprise Zone", eligibility_index.county_table(EZ_loaders.AL_EZ_COUNTIES))],
+}
+
+# Columns to be return regardless of selected states
+BASE_COLS = ["latitude", "longitude", "GEOID", "State", "NMTC Eligibility", "Opportunity Zone", "USDA Eligible"]
+
+
+@dataclass
+class CheckWarning:
+    # code is machine readable ("unmatched_points", "layer_failed", ...),
+    # data holds the offending rows or the layer name when there is one
+    code: str
+    message: str
+    data: object = None
+
+
+# Worker threads for layer downloads; they are I/O bound
+MAX_LOAD_WORKERS = 8
+# A layer that failed to load is tried again on the next check after this
+# many seconds, not on every check
+LOAD_RETRY_SECONDS = float(os.environ.get("ZONE_LOAD_RETRY_SECONDS", 300))
+
+# Kept per state for the whole process, so changing the state selection
+# only loads the states that are new
+@lru_cache(maxsize=None)
+def load_state_tracts(fips):
+    with metrics.stage("load_state_tracts", state=fips) as record:
+        parquet_path = EZ_loaders.download_dataset_file(f"tl_2024_{fips}_tract.parquet")
+        gdf = layer_cache.normalize_layer(gpd.read_parquet(parquet_path, memory_map=True), simplify_tolerance=0, explode=False)
+        # The file sits in the Hub cache under the dataset revision it came
+        # from, so the version changes whenever the tract files are updated
+        gdf.attrs["version"] = f"hf:{os.path.basename(os.path.dirname(parquet_path))}"
+        record["features"] = len(gdf)
+    return gdf
+
+
+# Load selected states' files
+def load_states_tracts(fips_codes, max_workers=MAX_LOAD_WORKERS):
+    with metrics.stage("load_states_tracts", states=len(fips_codes)) as record:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            gdf_list = list(pool.map(load_state_tracts, fips_codes))
+        gdf = pd.concat(gdf_list).reset_index(drop=True)
+        gdf.attrs["version"] = tracts_version(gdf_list)
+        record["features"] = len(gdf)
+    return gdf
+
+
+# One version for a set of tract layers; layers from the same revision of
+# the tract files share it, so adding a state keeps earlier results
+def tracts_version(layers):
+    return "+".join(sorted({layer_version(layer) for layer in layers}))
+
+
+# Result flags are categoricals over these (one byte per row instead of a
+# string object); rows a column doesn't apply to are missing
+YES_NO = pd.CategoricalDtype(["No", "Yes"])
+STATE_NAMES = pd.CategoricalDtype(sorted(STATE_FIPS))
+
+
+# Yes/No flags for mask; with rows, mask covers only those rows of a column
+# of length n and the rest are missing
+def yes_no(mask, rows=None, n=None):
+    codes = np.asarray(mask).astype(np.int8)
+    if rows is not None:
+        column = np.full(n, -1, dtype=np.int8)
+        column[rows] = codes
+        codes = column
+    return pd.Categorical.from_codes(codes, dtype=YES_NO)
+
+
+_local_versions = itertools.count()
+
+
+# Version of a layer (or TractZoneIndex) for the result memo. Layers that
+# didn't come through layer_cache get a one-off version the first time
+# they are seen, so their results are only reused for that same object.
+def layer_version(layer):
+    attrs = layer.attrs if isinstance(layer, pd.DataFrame) else vars(layer)
+    if "version" not in attrs:
+        attrs["version"] = f"local-{next(_local_versions)}"
+    return attrs["version"]
+
+
+class ZoneChecker:
+    # Holds every layer needed for a set of states so they are loaded once
+    # and reused for any number of check() calls (UI reruns or batch jobs).
+    #
+    # With fips_codes=None the checker runs in national mode: points are
+    # resolved with the national tract index, every state's columns are
+    # returned, and a state's layers are only loaded once a point lands in it.
+    #
+    # Results are memoized per point and layer (see result_memo.py); pass
+    # the same memo to every checker to reuse results across them.
+
+    def __init__(self, fips_codes=None, tracts_gdf=None, usda_gdf=None, eligibility=None, zone_layers=None,
+                 tract_zones=None, tract_index=None, memo=None, usda_states=None):
+        self.fips_codes = None if fips_codes is None else list(fips_codes)
+        if self.fips_codes is None and tract_index is None:
+            tract_index = national_tract_index.get_index()
+            if tract_index is None:
+                raise ValueError("No states selected and no national tract index found; "
+                                 "build one with 'python tract_index.py'")
+        self.tract_index = tract_index
+        # Tract polygons by state as loaded; tracts_gdf joins them on first use
+        self._tract_parts = {}
+        self.tracts_gdf = tracts_gdf
+        self.usda_gdf = usda_gdf
+        # USDA layer pieces by state, unless a layer covering everything was given
+        self._usda_parts = {}
+        self._usda_all = usda_gdf is not None
+        # States a given usda_gdf covers (None = all of them)
+        self._usda_covers = None if usda_states is None else list(usda_states)
+        # EligibilityIndex; a flags DataFrame is converted once here
+        if isinstance(eligibility, pd.DataFrame):
+            eligibility = eligibility_index.EligibilityIndex.from_frame(eligibility)
+        self.eligibility = eligibility
+        # column name -> GeoDataFrame (None if it could not be loaded)
+        self.zone_layers = dict(zone_layers or {})
+        # column name ("USDA Eligible" or a zone column) -> TractZoneIndex
+        self.tract_zones = dict(tract_zones or {})
+        self.load_warnings = []
+        self._load_lock = threading.RLock()
+        # Layer name -> time.monotonic() after which a failed load is retried
+        self._failed = {}
+        # States load() has run for, and when the next failed layer is due
+        self._tried = set()
+        self._retry_at = math.inf
+        self.memo = memo if memo is not None else result_memo.ResultMemo()
+
+    @property
+    def tracts_gdf(self):
+        if self._tracts_gdf is None and self._tract_parts:
+            parts = [self._tract_parts[fip] for fip in self.selected_states() if fip in self._tract_parts]
+            self._tracts_gdf = pd.concat(parts).reset_index(drop=True)
+        return self._tracts_gdf
+
+    @tracts_gdf.setter
+    def tracts_gdf(self, gdf):
+        self._tracts_gdf = gdf
+        self._tract_ints = None
+
+    # Version of whatever resolves points to tracts, for the memoized GEOIDs
+    @property
+    def tracts_version(self):
+        if self.tract_index is not None:
+            return layer_version(self.tract_index)
+        if self._tract_parts:
+            return tracts_version(self._tract_parts.values())
+        return layer_version(self._tracts_gdf) if self._tracts_gdf is not None else None
+
+    # States whose columns appear in the results
+    def selected_states(self):
+        return self.fips_codes if self.fips_codes is not None else list(STATE_FIPS.values())
+
+    def zone_columns(self, fips_codes=None):
+        fips_codes = self.selected_states() if fips_codes is None else fips_codes
+        return [(fip, col_name, loader_func)
+                for fip in fips_codes
+                for col_name, loader_func in STATE_ZONE_LOADERS.get(fip, [])]
+
+    def county_columns(self):
+        return [(fip, col_name, table)
+                for fip, zones in STATE_COUNTY_ZONES.items()
+                if fip in self.selected_states()
+                for col_name, table in zones]
+
+    # States the loaded USDA layer covers
+    def usda_states(self):
+        if not self._usda_all:
+            return list(self._usda_parts)
+        if self._usda_covers is None:
+            return self.selected_states()
+        return [fip for fip in self.selected_states() if fip in self._usda_covers]
+
+    # The USDA layer(s) covering the given states: that state's pieces, or
+    # the one layer given for everything
+    def usda_layers(self, fips_codes):
+        if self._usda_all:
+            return [self.usda_gdf]
+        return [self._usda_parts[fip] for fip in fips_codes if fip in self._usda_parts]
+
+    # Tract polygons for the given states from whichever source is loaded
+    def tracts_for(self, fips_codes):
+        if self.tract_index is not None:
+            return self.tract_index.tracts_for(fips_codes)
+        if self._tract_parts:
+            parts = [self._tract_parts[fip] for fip in fips_codes if fip in self._tract_parts]
+            return pd.concat(parts).reset_index(drop=True) if parts else self.tracts_gdf.iloc[:0]
+        return self.tracts_gdf[self.tracts_gdf["GEOID"].str[:2].isin(fips_codes)]
+
+    # Bounding box of a state's tracts in EPSG:4326
+    def state_bbox(self, fip):
+        if self.tract_index is not None:
+            return self.tract_index.state_bounds.get(fip)
+        return tuple(self.tracts_for([fip]).to_crs("EPSG:4326").total_bounds)
+
+    # Fetch every missing layer for fips_codes (default: the selected states)
+    # at once on a bounded thread pool. The USDA layer is requested per state
+    # with that state's bbox, as soon as its tracts arrive if they are being
+    # downloaded too. A failed layer becomes a load warning (one per layer)
+    # and doesn't stop the others; it is tried again once LOAD_RETRY_SECONDS
+    # have passed. Only losing every tract file or the eligibility flags is
+    # fatal. on_progress(layer, done, total, error) is called from this
+    # thread after each layer finishes.
+    def load(self, fips_codes=None, max_workers=MAX_LOAD_WORKERS, on_progress=None):
+        fips_codes = list(fips_codes if fips_codes is not None else (self.fips_codes or []))
+        # National mode loads from inside check(), which may run on several threads
+        with self._load_lock:
+            self._load(fips_codes, max_workers, on_progress)
+            self._tried.update(fips_codes)
+            self._retry_at = min(self._failed.values(), default=math.inf)
+            self._drop_stale_indexes()
+        return self
+
+    # Whether load(fips_codes) has anything to do: a state it hasn't run for
+    # yet, or a failed layer that is due again
+    def needs_load(self, fips_codes=None):
+        fips_codes = fips_codes if fips_codes is not None else (self.fips_codes or [])
+        return (self.eligibility is None or not self._tried.issuperset(fips_codes)
+                or time.monotonic() >= self._retry_at)
+
+    def _due(self, name):
+        return time.monotonic() >= self._failed.get(name, 0)
+
+    # Replace the load warning about layer `name` (None just removes it), so
+    # retries don't pile up copies
+    def _set_warning(self, name, warning=None):
+        self.load_warnings = [w for w in self.load_warnings if w.data != name] + ([warning] if warning else [])
+
+    def _load(self, fips_codes, max_workers, on_progress):
+        def tracts_name(fip):
+            return f"Census tracts ({FIPS_STATES.get(fip, fip)})"
+
+        def usda_name(fip):
+            return f"USDA ineligible areas ({FIPS_STATES.get(fip, fip)})"
+
+        need_tracts = self.tract_index is None and (self._tracts_gdf is None or bool(self._tract_parts))
+        tract_states = [fip for fip in fips_codes
+                        if fip not in self._tract_parts and self._due(tracts_name(fip))] if need_tracts else []
+        # A state's USDA piece needs its tracts for the bbox
+        usda_states = [] if self._usda_all else [
+            fip for fip in fips_codes
+            if fip not in self._usda_parts and self._due(usda_name(fip))
+            and (not need_tracts or fip in self._tract_parts or fip in tract_states)]
+        zone_jobs = [(col_name, loader_func) for _, col_name, loader_func in self.zone_columns(fips_codes)
+                     if col_name not in self.zone_layers
+                     or (self.zone_layers[col_name] is None and col_name in self._failed and self._due(col_name))]
+
+        total = len(zone_jobs) + (self.eligibility is None) + len(usda_states) + len(tract_states)
+        if total == 0:
+            if need_tracts and not self._tract_parts:
+                raise RuntimeError("Could not load census tracts: " +
+                                   "; ".join(w.message for w in self.load_warnings if w.code == "layer_failed"))
+            return self
+        done = 0
+
+        tract_parts = {}
+        usda_loaded = False
+        failures = {}
+        loaded = []
+        jobs = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            def submit(kind, key, name, func, *args):
+                future = pool.submit(func, *args)
+                jobs[future] = (kind, key, name)
+                return future
+
+            for fip in tract_states:
+                submit("tracts", fip, tracts_name(fip), load_state_tracts, fip)
+            for fip in usda_states:
+                if fip in tract_states:
+                    # Requested as soon as its tracts arrive
+                    continue
+                bbox = self.state_bbox(fip)
+                if bbox is None:
+                    # State not in the national index; nothing to query
+                    total -= 1
+                    continue
+                submit("usda", fip, usda_name(fip), EZ_loaders.load_usda_data, bbox)
+            if self.eligibility is None:
+                submit("eligibility", None, "Eligibility flags", eligibility_index.load_eligibility_index)
+            for col_name, loader_func in zone_jobs:
+                submit("zone", col_name, col_name, loader_func)
+
+            pending = set(jobs)
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    kind, key, name = jobs[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = None
+                        failures[name] = e
+                    done += 1
+                    if on_progress is not None:
+                        on_progress(name, done, total, failures.get(name))
+                    if result is not None:
+                        loaded.append(name)
+
+                    if kind == "tracts" and result is not None:
+                        tract_parts[key] = result
+                        if key in usda_states:
+                            bbox = tuple(result.to_crs("EPSG:4326").total_bounds)
+                            pending.add(submit("usda", key, usda_name(key), EZ_loaders.load_usda_data, bbox))
+                    elif kind == "tracts" and key in usda_states:
+                        # No bbox without tracts, so that state's USDA piece is skipped
+                        done += 1
+                        failures[usda_name(key)] = RuntimeError("its census tracts could not be loaded")
+                    elif kind == "usda" and result is not None:
+                        self._usda_parts[key] = result
+                        usda_loaded = True
+                    elif kind == "usda" and name not in failures:
+                        failures[name] = RuntimeError("no data was returned")
+                    elif kind == "eligibility":
+                        self.eligibility = result
+                    elif kind == "zone":
+                        self.zone_layers[key] = result
+                        if result is None and name not in failures:
+                            failures[name] = None
+
+        retry_at = time.monotonic() + LOAD_RETRY_SECONDS
+        for name in loaded:
+            self._failed.pop(name, None)
+            self._set_warning(name)
+        for name, e in failures.items():
+            self._failed[name] = retry_at
+            if e is None:
+                self._set_warning(name, CheckWarning("layer_empty", f"{name} data is empty or could not be loaded", name))
+            else:
+                self._set_warning(name, CheckWarning("layer_failed", f"Failed to load {name}: {e}", name))
+
+        if tract_parts:
+            self._tract_parts.update(tract_parts)
+            # Joined again on next use
+            self.tracts_gdf = None
+        elif need_tracts and not self._tract_parts:
+            raise RuntimeError(f"Could not load census tracts: {failures}")
+        if usda_loaded:
+            # State bboxes overlap, so the same feature can come back twice;
+            # harmless for a within-any test
+            parts = list(self._usda_parts.values())
+            self.usda_gdf = gpd.GeoDataFrame(pd.concat(parts, ignore_index=True), crs=parts[0].crs)
+        if self.eligibility is None:
+            raise RuntimeError(f"Could not load eligibility flags: {failures.get('Eligibility flags')}")
+        return self
+
+    # Offline step: intersect the tracts with every loaded layer so check()
+    # only needs the tract join (see tract_zones.py)
+    def precompute(self):
+        self.tract_zones.update(tract_zones.build_for_checker(self))
+        return self
+
+    def load_precomputed(self, directory):
+        names = ["USDA Eligible"] + [col_name for _, col_name, _ in self.zone_columns()]
+        self.tract_zones.update(tract_zones.load_indexes(names, directory))
+        self._drop_stale_indexes()
+        return self
+
+    # Version of the loaded layer behind column `name` (the USDA pieces
+    # joined like tracts_version), None while it isn't loaded
+    def source_version(self, name):
+        if name == "USDA Eligible" and not self._usda_all and self._usda_parts:
+            return tracts_version(self.usda_layers(self.usda_states()))
+        layer = self.usda_gdf if name == "USDA Eligible" else self.zone_layers.get(name)
+        return layer_version(layer) if layer is not None else None
+
+    # Precomputed indexes built from another version of their layer than the
+    # one loaded now would give stale answers; those columns go back to the
+    # exact join. Indexes whose layer isn't loaded yet are checked once it is.
+    def _drop_stale_indexes(self):
+        for name, index in list(self.tract_zones.items()):
+            version = self.source_version(name)
+            if version is not None and layer_version(index) != version:
+                del self.tract_zones[name]
+
+    # Boolean array: which points fall within any polygon of layer
+    @staticmethod
+    def _within(geoms, layer):
+        point_idx, _ = layer.sindex.query(geoms, predicate="within")
+        mask = np.zeros(len(geoms), dtype=bool)
+        mask[point_idx] = True
+        return mask
+
+    # Zone membership of the points at rows, from the precomputed tract index
+    # when there is one, otherwise (and for points outside every tract) by an
+    # exact join
+    def _in_layer(self, name, layer, project, geoids, rows):
+        index = self.tract_zones.get(name)
+        if index is None:
+            return self._within(project(layer.crs, rows), layer)
+
+        geoids = geoids[rows]
+        mask = index.lookup(geoids, project(index.crs, rows))
+        missing = geoids == eligibility_index.MISSING
+        if layer is not None and missing.any():
+            mask[missing] = self._within(project(layer.crs, rows[missing]), layer)
+        return mask
+
+    # _in_layer for the points at rows, reusing the memoized result of every
+    # point already checked against this version of the layer. Only points
+    # inside a tract are memoized; the others are cheap to redo and may
+    # still be fixed by a tract file that failed to load.
+    def _memo_in_layer(self, memo_name, version, name, layer, project, geoids, keys, rows, record):
+        if version is None:
+            return self._in_layer(name, layer, project, geoids, rows)
+        mask, found = self.memo.get((memo_name, version), keys[rows], bool)
+        todo = np.flatnonzero(~found)
+        record["memo_hits"] = record.get("memo_hits", 0) + len(rows) - len(todo)
+        if len(todo):
+            mask[todo] = self._in_layer(name, layer, project, geoids, rows[todo])
+            keep = todo[geoids[rows[todo]] != eligibility_index.MISSING]
+            self.memo.put((memo_name, version), keys[rows[keep]], mask[keep])
+        return mask
+
+    # Version of whatever answers layer `name` (see layer_version)
+    def _version(self, name, layer):
+        return layer_version(layer if layer is not None else self.tract_zones[name])
+
+    # project(crs, rows=None) -> the points of df (or those at rows) as a
+    # geometry array in crs. Points are only built when asked for. Every
+    # cached layer is already in the canonical CRS, so normally this never
+    # reprojects; layers passed in by the caller may differ and are
+    # reprojected at most once each.
+    @staticmethod
+    def _projector(df):
+        lon = df["longitude"].to_numpy()
+        lat = df["latitude"].to_numpy()
+        projected = {}
+
+        def points(rows, crs):
+            series = gpd.GeoSeries(gpd.points_from_xy(lon[rows], lat[rows]), crs=layer_cache.CANONICAL_CRS)
+            return (series if series.crs == crs else series.to_crs(crs)).values
+
+        def project(crs, rows=None):
+            key = str(pyproj.CRS(crs))
+            if key in projected:
+                return projected[key] if rows is None else projected[key][rows]
+            if rows is not None:
+                # A subset isn't kept; reruns mostly touch a few rows per layer
+                return points(rows, crs)
+            projected[key] = points(slice(None), crs)
+            return projected[key]
+        return project
+
+    # int64 GEOID of the tract each point falls in (MISSING if none)
+    def _tract_geoids(self, df, project):
+        if self.tract_index is not None:
+            return self.tract_index.lookup(df["longitude"].to_numpy(), df["latitude"].to_numpy())
+
+        geoms = project(self.tracts_gdf.crs)
+        if self._tract_ints is None:
+            self._tract_ints = eligibility_index.geoid_ints(self.tracts_gdf["GEOID"])
+        point_idx, tract_idx = self.tracts_gdf.sindex.query(geoms, predicate="within")
+        geoids = np.full(len(geoms), eligibility_index.MISSING, dtype=np.int64)
+        # A point on a shared boundary can match two tracts; keep the first
+        geoids[point_idx[::-1]] = self._tract_ints[tract_idx[::-1]]
+        return geoids
+
+    # (memo name, version, rows) groups of points for the USDA column. Each
+    # state's piece of the layer is fetched (and refreshed) on its own, and
+    # a point's answer only depends on its own state's piece, so the pieces
+    # are memoized separately; adding a state leaves the others' results.
+    # Points of a state whose piece didn't load (and points outside every
+    # tract) are in no group: the other pieces can't answer for them.
+    def _usda_groups(self, point_states):
+        if self._usda_all or not self._usda_parts:
+            version = self._version("USDA Eligible", self.usda_gdf)
+            if self._usda_covers is None:
+                rows = np.arange(len(point_states))
+            else:
+                rows = np.flatnonzero(np.isin(point_states, [int(fip) for fip in self._usda_covers]))
+            return [("USDA Eligible", version, rows)]
+        groups = []
+        for code in np.unique(point_states):
+            part = self._usda_parts.get(f"{code:02d}")
+            if part is not None:
+                groups.append((f"USDA Eligible {code:02d}", layer_version(part), np.flatnonzero(point_states == code)))
+        return groups
+
+    def unmatched_warning(self, rows, count=None):
+        count = len(rows) if count is None else count
+        hint = " and make sure you selected the correct states." if self.fips_codes else "."
+        return CheckWarning(
+            "unmatched_points",
+            f"{count} coordinate(s) did not fall within any census tract. Check your coordinates{hint}",
+            rows,
+        )
+
+    def check_arrays(self, latitude, longitude):
+        df = pd.DataFrame({"latitude": np.asarray(latitude, dtype=float),
+                           "longitude": np.asarray(longitude, dtype=float)})
+        return self.check(df)
+
+    # Spatial join + eligibility flags for a frame with latitude/longitude
+    # columns. Returns (results, warnings); nothing here touches the UI.
+    # Each distinct location (after snapping, see result_memo.py) is checked
+    # once and its results are expanded back to every row at that location.
+    def check(self, df):
+        with metrics.stage("check", points=len(df)) as record:
+            latitude, longitude = result_memo.snap(df["latitude"], df["longitude"])
+            keys, first, inverse = np.unique(result_memo.point_keys(latitude, longitude),
+                                             return_index=True, return_inverse=True)
+            record["sites"] = len(keys)
+            sites = pd.DataFrame({"latitude": latitude[first], "longitude": longitude[first]})
+            results, warnings = self._check(sites, keys)
+
+            results = results.iloc[inverse.ravel()].reset_index(drop=True)
+            results["latitude"] = df["latitude"].to_numpy()
+            results["longitude"] = df["longitude"].to_numpy()
+            unmatched = results[results["GEOID"].isna()]
+            if not unmatched.empty:
+                warnings.append(self.unmatched_warning(unmatched[["latitude", "longitude"]]))
+            record["unmatched"] = len(unmatched)
+        return results, warnings
+
+    # check() for distinct sites, keys being their point keys
+    def _check(self, df, keys):
+        # Only loads when a failed layer is due for another try
+        if self.needs_load():
+            self.load()
+
+        with metrics.stage("check.tract_join") as record:
+            project = self._projector(df)
+            results = df[["latitude", "longitude"]].copy()
+            geoids, found = self.memo.get(("GEOID", self.tracts_version), keys, np.int64)
+            if self.fips_codes is not None:
+                # The memo is shared with checkers for other states; a point
+                # in a state outside this selection is unmatched here
+                found &= np.isin(eligibility_index.state_codes(geoids), [int(fip) for fip in self.fips_codes])
+            todo = np.flatnonzero(~found)
+            record["memo_hits"] = len(df) - len(todo)
+            if len(todo):
+                fresh = df.iloc[todo]
+                geoids[todo] = self._tract_geoids(fresh, self._projector(fresh))
+                keep = todo[geoids[todo] != eligibility_index.MISSING]
+                self.memo.put(("GEOID", self.tracts_version), keys[keep], geoids[keep])
+            results["GEOID"] = eligibility_index.geoid_strings(geoids)
+
+            point_states = eligibility_index.state_codes(geoids) # First 2 digits = state FIPS
+            results["State"] = pd.Categorical(pd.Series(point_states).map(STATE_CODE_NAMES), dtype=STATE_NAMES)
+        if self.fips_codes is None:
+            # National mode: load whatever the states in this batch need
+            codes = set(np.unique(point_states).tolist())
+            batch_states = [fip for fip in self.selected_states() if int(fip) in codes]
+            if self.needs_load(batch_states):
+                self.load(batch_states)
+        warnings = list(self.load_warnings)
+
+        # Eligibility flags by GEOID
+        with metrics.stage("check.eligibility"):
+            flags = self.eligibility.lookup(geoids)
+            for col in eligibility_index.FLAG_COLS:
+                results[col] = flags[col].array
+
+        # If point falls in an ineligible area, mark as not eligible
+        if self.usda_gdf is not None or "USDA Eligible" in self.tract_zones:
+            with metrics.stage("check.zone.USDA Eligible", points=len(df),
+                               precomputed="USDA Eligible" in self.tract_zones) as record:
+                groups = self._usda_groups(point_states)
+                answered = np.concatenate([rows for _, _, rows in groups] + [np.zeros(0, dtype=np.int64)])
+                ineligible = np.zeros(len(df), dtype=bool)
+                for memo_name, version, rows in groups:
+                    ineligible[rows] = self._memo_in_layer(memo_name, version, "USDA Eligible", self.usda_gdf,
+                                                           project, geoids, keys, rows, record)
+                results["USDA Eligible"] = yes_no(~ineligible[answered], answered, len(df))
+        else:
+            results["USDA Eligible"] = yes_no([], [], len(df))
+
+        # Every selected state's columns are always returned, so chunks of one
+        # upload line up; a layer that failed to load leaves its column empty
+        state_cols = []
+        for fip, col_name, _ in self.zone_columns():
+            state_cols.append(col_name)
+            # N/A if coordinate is not in corresponding State
+            rows = np.flatnonzero(point_states == int(fip))
+            column = yes_no([], [], len(df))
+            zone_gdf = self.zone_layers.get(col_name)
+            if len(rows) and (zone_gdf is not None or col_name in self.tract_zones):
+                with metrics.stage(f"check.zone.{col_name}", points=len(rows),
+                                   precomputed=col_name in self.tract_zones) as record:
+                    mask = self._memo_in_layer(col_name, self._version(col_name, zone_gdf), col_name, zone_gdf,
+                                               project, geoids, keys, rows, record)
+                    column = yes_no(mask, rows, len(df))
+            results[col_name] = column
+
+        for fip, col_name, table in self.county_columns():
+            with metrics.stage(f"check.county.{col_name}", points=len(df)):
+                results[col_name] = yes_no(eligibility_index.in_counties(table, geoids))
+            state_cols.append(col_name)
+
+        return results[BASE_COLS + state_cols], warnings